@@ -6,32 +6,215 @@ A comprehensive web interface for downloading videos and audio using yt-dlp
 import os
 import re
 import json
+import gzip
+import time
 import uuid
+import heapq
+import random
+import contextlib
+import queue
+import collections
+import hashlib
+import mimetypes
 import threading
+import shutil
+import struct
+import unicodedata
+import zlib
 import sqlite3
-from datetime import datetime
+import urllib.parse
+import urllib.request
+import click
+from datetime import datetime, timedelta
 from flask import Flask, render_template, request, jsonify, send_file, Response
 from flask_cors import CORS
 import yt_dlp
 
+try:
+    import brotli
+except ImportError:  # brotli is optional - fall back to gzip only
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional - thumbnails are then served at original size
+    Image = None
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows - only run a single server process there
+    fcntl = None
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=['X-Total-Count'])
 
 # Configuration
 DOWNLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'downloads')
 SUBTITLES_FOLDER = os.path.join(DOWNLOAD_FOLDER, 'subtitles')
 DATABASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'download_history.db')
+THUMBNAILS_FOLDER = os.path.join(DOWNLOAD_FOLDER, 'thumbnails')
 os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
 os.makedirs(SUBTITLES_FOLDER, exist_ok=True)
+os.makedirs(THUMBNAILS_FOLDER, exist_ok=True)
+
+# Response compression
+COMPRESS_MIN_SIZE = 1024  # Don't bother compressing tiny payloads
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 5
+COMPRESS_MIMETYPES = {'application/json', 'text/html', 'text/css', 'text/javascript', 'application/javascript'}
+
+# Heights offered by the quality picker (used for the compact format ladder)
+QUALITY_LADDER = [2160, 1440, 1080, 720, 480, 360]
+
+# Columns that may be requested from /api/history with fields=
+HISTORY_COLUMNS = [
+    'id', 'url', 'title', 'thumbnail', 'uploader', 'duration', 'quality', 'format_type',
+    'audio_format', 'filename', 'filesize', 'status', 'error', 'created_at', 'completed_at',
+    'playlist_title'
+]
+
+# Thumbnail cache
+THUMBNAIL_SIZES = {'small': 160, 'medium': 320, 'large': 640}  # Variant widths in pixels
+THUMBNAIL_CACHE_MAX_BYTES = 200 * 1024 * 1024
+THUMBNAIL_MAX_FETCH_BYTES = 10 * 1024 * 1024
+THUMBNAIL_FETCH_TIMEOUT = 15
+THUMBNAIL_CACHE_MAX_AGE = 365 * 24 * 3600
+THUMBNAIL_KEYS_CACHE_SIZE = 10000  # Registered URLs remembered to skip repeat database writes
+
+# Playlist downloads: entries downloaded in parallel, each worker keeps one YoutubeDL session
+PLAYLIST_CONCURRENCY = 2
+PLAYLIST_MAX_CONCURRENCY = 4
+
+# Warm YoutubeDL pool
+YDL_POOL_MAX_USES = 25  # Recycle an instance after this many jobs
+YDL_POOL_MAX_IDLE = 4  # Idle instances kept per option profile
+YDL_POOL_IDLE_TIMEOUT = 300  # Seconds before an idle instance is closed
 
 # Store download progress and status
 downloads = {}
 download_lock = threading.Lock()
 
+# Automatic retries with backoff
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 5  # Seconds, doubled on every attempt
+RETRY_RATE_LIMIT_BASE_DELAY = 30  # Rate limited jobs start from a longer delay
+RETRY_MAX_DELAY = 600
+
+# Per-host circuit breakers
+BREAKER_FAILURE_THRESHOLD = 5  # Retryable failures in a row before a host is paused
+BREAKER_COOLDOWN = 30  # Seconds a tripped host stays paused, doubled on repeated trips
+BREAKER_MAX_COOLDOWN = 900
+BREAKER_PROBE_INTERVAL = 5  # How often parked jobs re-check a recovering host
+BREAKER_CLOSE_AFTER = 4  # Successes needed before a recovering host is fully resumed
+
+# Error message fragments used to classify yt-dlp failures
+RATE_LIMIT_ERROR_PATTERNS = ['http error 429', 'too many requests', 'rate limit', 'rate-limit']
+PERMANENT_ERROR_PATTERNS = [
+    'private video', 'video unavailable', 'not available in your country', 'geo restrict',
+    'geo-restrict', 'members-only', 'sign in to confirm your age', 'unsupported url',
+    'has been removed', 'copyright', 'http error 403', 'http error 404', 'http error 410',
+    'requested format is not available', 'no space left', 'not enough storage',
+    'certificate verify failed'
+]
+# Checked before the permanent patterns: a 403 on the media itself (not the
+# page) is a signed format URL that expired or was revoked mid-download, and
+# the retry extracts fresh URLs
+EXPIRED_MEDIA_ERROR_PATTERNS = ['unable to download video data: http error 403']
+TRANSIENT_ERROR_PATTERNS = [
+    'timed out', 'timeout', 'connection reset', 'connection refused', 'connection aborted',
+    'remote end closed', 'temporary failure', 'network is unreachable', 'incomplete read',
+    'http error 500', 'http error 502', 'http error 503', 'http error 504',
+    'unable to download webpage', 'unable to download video data',
+    'unexpected_eof_while_reading', 'eof occurred in violation of protocol', 'bad record mac'
+]
+# yt-dlp writes subtitles before the media, so these fail the whole download
+SUBTITLE_ERROR_PATTERNS = ['unable to download video subtitles']
+# Subtitle downloads fire progress hooks too, these extensions tell them apart from the media
+SUBTITLE_EXTENSIONS = {'vtt', 'srt', 'ass', 'ssa', 'ttml', 'dfxp', 'srv1', 'srv2', 'srv3', 'json3', 'lrc'}
+
+# Adaptive per-host request pacing (AIMD)
+PACER_INITIAL_RATE = 1.0  # Requests per second for a host we know nothing about
+PACER_MIN_RATE = 0.1
+PACER_MAX_RATE = 20.0
+PACER_INCREASE_STEP = 0.1  # Added to the rate after each healthy response
+PACER_DECREASE_FACTOR = 0.5  # Applied to the rate when the host pushes back
+PACER_BACKOFF_STATUSES = {429, 503}
+PACER_MAX_RETRY_AFTER = 120  # Cap on a Retry-After pause; longer outages are left to the circuit breaker
+PACER_SAVE_INTERVAL = 30  # Seconds between persisting learned rates
+
+# Storage management
+STORAGE_QUOTA_BYTES = 0  # Maximum size of the library, 0 = only limited by the disk
+STORAGE_MIN_FREE_BYTES = 1024 * 1024 * 1024  # Always leave this much of the disk free
+STORAGE_MERGE_HEADROOM = 1.0  # Extra fraction reserved for merging/converting output
+STORAGE_EVICT_LRU = True  # Evict least recently served files to make room
+
+# Library layout: output templates relative to DOWNLOAD_FOLDER. Apart from
+# 'flat', files are named after their extractor and id (so different videos
+# never share a name) and spread over subfolders; "%(id.-2:)s" shards on the
+# last two characters of the id, which are evenly spread for random and
+# sequential ids alike.
+STORAGE_LAYOUTS = {
+    'flat': '%(title)s.%(ext)s',  # Legacy: one folder, equal titles collide
+    'hash': '%(id.-2:)s/%(extractor_key)s-%(id)s.%(ext)s',
+    'extractor': '%(extractor_key)s/%(id.-2:)s/%(extractor_key)s-%(id)s.%(ext)s',
+    'uploader': '%(extractor_key)s/%(uploader_id,channel_id,uploader)s/%(extractor_key)s-%(id)s.%(ext)s',
+    'date': '%(upload_date>%Y)s/%(upload_date>%m)s/%(extractor_key)s-%(id)s.%(ext)s',
+}
+STORAGE_LAYOUT = 'extractor'
+
+# Job journal
+JOURNAL_FLUSH_INTERVAL = 5  # Seconds between progress writes per job
+PARTIAL_FILE_GRACE = 3600  # Orphaned partial files younger than this are left alone
+SERVICES_LOCK_PATH = DATABASE_PATH + '.lock'  # Held by the one process running background services
+jobs_recovered = False
+services_started = False
+services_lock_file = None
+recovery_lock = threading.Lock()
+
 # Download queue for batch downloads
-download_queue = []
+download_queue = collections.deque()
 queue_lock = threading.Lock()
 queue_processing = False
+QUEUE_CONCURRENCY = 4  # Queued downloads allowed to run at once
+queue_active = 0  # Queued downloads holding a slot, guarded by download_lock
+queue_slot_freed = threading.Condition(download_lock)
+
+# Stream-while-downloading
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_POLL_INTERVAL = 0.2  # Seconds to wait for more bytes at the end of a growing file
+STREAM_START_TIMEOUT = 60  # Seconds to wait for a queued/starting download to begin
+
+# Bulk ingestion
+BULK_MAX_URLS = 100000
+batch_jobs = {}  # batch_id -> download ids
+
+# Scheduling (times are server local time, days are 0=Monday..6=Sunday)
+SCHEDULE_WINDOWS = {
+    # Named windows requests can refer to; rate_limit is bytes/s shared by the window's jobs, 0 = unlimited
+    'overnight': {'start': '01:00', 'end': '07:00', 'days': list(range(7)), 'concurrency': 4, 'rate_limit': 0},
+    'daytime': {'start': '09:00', 'end': '18:00', 'days': list(range(7)), 'concurrency': 1,
+                'rate_limit': 2 * 1024 * 1024},
+}
+SCHEDULE_DEFAULT_CONCURRENCY = 2  # For windows given inline in a request
+SCHEDULE_MIN_REPEAT = 3600  # Shortest interval between runs of a recurring job
+SCHEDULER_CHECK_INTERVAL = 30  # Seconds between checks for freed window slots
+
+# Subscriptions
+SUBSCRIPTION_DEFAULT_INTERVAL = 3600  # Seconds between polls of a feed
+SUBSCRIPTION_MIN_INTERVAL = 300
+SUBSCRIPTION_JITTER = 0.1  # Poll intervals vary by up to this fraction
+SUBSCRIPTION_POLL_CONCURRENCY = 4  # Feeds polled at the same time
+SUBSCRIPTION_FIRST_POLL_ITEMS = 30  # Entries marked as seen when a feed is first polled
+SUBSCRIPTION_IDLE_CHECK = 60  # Seconds between checks when nothing is due
+
+# ZIP export
+EXPORT_MAX_FILES = 10000
+EXPORT_TTL = 7 * 24 * 3600  # Seconds an export link stays valid (and resumable)
+EXPORT_CRC_CACHE_SIZE = 4096  # Checksums remembered so resumed exports don't re-read files
+
+# History statistics
+STATS_DAYS = 30  # Days returned by /api/stats by default
+STATS_TOP = 10  # Uploaders/formats returned by /api/stats by default
 
 
 def init_database():
@@ -57,46 +240,416 @@ def init_database():
             completed_at TIMESTAMP
         )
     ''')
+    try:
+        cursor.execute('ALTER TABLE download_history ADD COLUMN playlist_title TEXT')
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS history_stats (
+            dimension TEXT,
+            key TEXT,
+            completed INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            bytes INTEGER DEFAULT 0,
+            stored_bytes INTEGER DEFAULT 0,
+            PRIMARY KEY (dimension, key)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_stats_bytes ON history_stats (dimension, bytes)')
+    try:
+        # Whether a completed row's file is still in the library
+        cursor.execute('ALTER TABLE download_history ADD COLUMN stored INTEGER DEFAULT 0')
+        stats_missing = True
+    except sqlite3.OperationalError:
+        # Column already exists. Aggregates written before repeat downloads
+        # stopped counting their file twice, and before rows without an
+        # uploader were left out of the ranking, are rebuilt once.
+        stats_missing = cursor.execute('''
+            SELECT 1 FROM history_stats WHERE dimension = 'uploader' AND key = ''
+            UNION ALL
+            SELECT 1 FROM download_history WHERE stored = 1 GROUP BY filename HAVING COUNT(*) > 1
+            LIMIT 1
+        ''').fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS thumbnail_cache (
+            key TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            content_hash TEXT,
+            bytes INTEGER DEFAULT 0,
+            last_access REAL DEFAULT 0
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_thumbnail_hash ON thumbnail_cache (content_hash)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS download_jobs (
+            id TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            quality TEXT,
+            audio_only INTEGER,
+            audio_format TEXT,
+            download_subs INTEGER,
+            sub_lang TEXT,
+            embed_subs INTEGER,
+            is_playlist INTEGER,
+            playlist_index INTEGER,
+            playlist_count INTEGER,
+            playlist_title TEXT,
+            title TEXT,
+            thumbnail TEXT,
+            filename TEXT,
+            progress REAL,
+            retry_count INTEGER,
+            batch_id TEXT,
+            window TEXT,
+            rate_limit INTEGER,
+            created_at REAL,
+            updated_at REAL
+        )
+    ''')
+    for column in ('batch_id TEXT', 'window TEXT', 'rate_limit INTEGER'):
+        try:
+            cursor.execute(f'ALTER TABLE download_jobs ADD COLUMN {column}')
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            id TEXT PRIMARY KEY,
+            download_id TEXT,
+            spec TEXT,
+            window TEXT,
+            repeat INTEGER DEFAULT 0,
+            not_before REAL,
+            next_run REAL,
+            runs INTEGER DEFAULT 0,
+            last_run REAL,
+            created_at REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_scheduled_jobs_next_run ON scheduled_jobs (next_run)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS download_batches (
+            id TEXT PRIMARY KEY,
+            options TEXT,
+            total INTEGER,
+            completed INTEGER DEFAULT 0,
+            failed INTEGER DEFAULT 0,
+            created_at REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS host_pacing (
+            host TEXT PRIMARY KEY,
+            rate REAL,
+            updated_at REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS file_access (
+            filename TEXT PRIMARY KEY,
+            last_served REAL,
+            serve_count INTEGER DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            id TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            title TEXT,
+            options TEXT,
+            interval INTEGER,
+            newest_first INTEGER DEFAULT 1,
+            backfill INTEGER DEFAULT 0,
+            enabled INTEGER DEFAULT 1,
+            next_poll REAL,
+            last_polled REAL,
+            last_new INTEGER DEFAULT 0,
+            last_error TEXT,
+            created_at REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_subscriptions_due ON subscriptions (enabled, next_poll)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS subscription_seen (
+            subscription_id TEXT,
+            archive_id TEXT,
+            seen_at REAL,
+            PRIMARY KEY (subscription_id, archive_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS library_files (
+            key TEXT PRIMARY KEY,
+            path TEXT UNIQUE NOT NULL,
+            title TEXT,
+            extractor TEXT,
+            video_id TEXT,
+            uploader TEXT,
+            uploader_id TEXT,
+            upload_date TEXT,
+            size INTEGER,
+            mtime REAL,
+            download_id TEXT,
+            added_at REAL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_library_files_mtime ON library_files (mtime)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS library_exports (
+            id TEXT PRIMARY KEY,
+            name TEXT,
+            files TEXT,
+            created_at REAL
+        )
+    ''')
+    # WAL keeps journal writes from download threads from blocking readers
+    cursor.execute('PRAGMA journal_mode=WAL').fetchone()
     conn.commit()
     conn.close()
+    
+    if stats_missing:
+        # Existing history predates the aggregates
+        rebuild_history_stats()
+
+
+# History aggregates: every write to download_history also updates these
+# counters in the same transaction, so /api/stats never scans the history.
+# A row contributes to one key per dimension; rewriting a row subtracts its
+# old contribution before adding the new one.
+STATS_COLUMNS = 'status, filesize, stored, created_at, uploader, format_type, quality'
+
+
+def history_stats_deltas(row, sign):
+    """Counter changes for adding (sign=1) or removing (sign=-1) a history row"""
+    completed = row['status'] in ('completed', 'evicted')
+    filesize = (row['filesize'] or 0) if completed else 0
+    values = (
+        sign * int(completed),
+        sign * int(row['status'] == 'error'),
+        sign * filesize,
+        sign * filesize * int(bool(row['stored'])),
+    )
+    keys = [
+        ('total', ''),
+        ('day', (row['created_at'] or '')[:10]),
+        ('format', f"{row['format_type'] or 'unknown'}/{row['quality'] or 'best'}"),
+    ]
+    if row['uploader']:
+        keys.append(('uploader', row['uploader']))  # Rows without one (mostly failures) aren't ranked
+    return [(dimension, key, *values) for dimension, key in keys]
+
+
+def apply_history_stats(conn, rows, sign):
+    """Add or subtract the contribution of history rows to the aggregates"""
+    deltas = [delta for row in rows for delta in history_stats_deltas(row, sign)]
+    if not deltas:
+        return
+    conn.executemany('''
+        INSERT INTO history_stats (dimension, key, completed, failed, bytes, stored_bytes)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(dimension, key) DO UPDATE SET
+            completed = completed + excluded.completed,
+            failed = failed + excluded.failed,
+            bytes = bytes + excluded.bytes,
+            stored_bytes = stored_bytes + excluded.stored_bytes
+    ''', deltas)
+    if sign < 0:
+        # Don't keep keys (e.g. uploaders) that no longer have any history
+        conn.executemany('''
+            DELETE FROM history_stats WHERE dimension = ? AND key = ? AND completed = 0 AND failed = 0
+        ''', [delta[:2] for delta in deltas])
+
+
+def rebuild_history_stats():
+    """Recompute all aggregates (and which files are still stored) from scratch"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            conn.execute('UPDATE download_history SET stored = 0')
+            # Repeat downloads of a URL overwrite one file, only the latest row holds it
+            conn.execute('''
+                UPDATE download_history SET stored = 1
+                WHERE status = 'completed' AND filename IN (SELECT key FROM library_files)
+                AND rowid = (SELECT MAX(rowid) FROM download_history AS newer
+                             WHERE newer.filename = download_history.filename AND newer.status = 'completed')
+            ''')
+            
+            conn.execute('DELETE FROM history_stats')
+            cursor = conn.execute(f'SELECT {STATS_COLUMNS} FROM download_history')
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                apply_history_stats(conn, rows, 1)
+    finally:
+        conn.close()
+
+
+def stats_entry(row, key_name):
+    """Aggregate row as returned by /api/stats"""
+    finished = row['completed'] + row['failed']
+    entry = {key_name: row['key']} if key_name else {}
+    entry.update({
+        'completed': row['completed'],
+        'failed': row['failed'],
+        'success_rate': round(row['completed'] / finished, 4) if finished else None,
+        'bytes': row['bytes'],
+        'stored_bytes': row['stored_bytes'],
+    })
+    return entry
+
+
+def get_history_stats(days=STATS_DAYS, top=STATS_TOP):
+    """Totals, recent days and top uploaders/formats, read straight from the aggregates"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT * FROM history_stats WHERE dimension = 'total'")
+    total = cursor.fetchone()
+    # Each query walks an index for a bounded number of rows
+    cursor.execute("SELECT * FROM history_stats WHERE dimension = 'day' ORDER BY key DESC LIMIT ?", (days,))
+    by_day = [stats_entry(row, 'day') for row in cursor.fetchall()]
+    cursor.execute("SELECT * FROM history_stats WHERE dimension = 'uploader' ORDER BY bytes DESC LIMIT ?", (top,))
+    by_uploader = [stats_entry(row, 'uploader') for row in cursor.fetchall()]
+    cursor.execute("SELECT * FROM history_stats WHERE dimension = 'format' ORDER BY bytes DESC LIMIT ?", (top,))
+    by_format = [stats_entry(row, 'format') for row in cursor.fetchall()]
+    conn.close()
+    
+    empty = {'key': '', 'completed': 0, 'failed': 0, 'bytes': 0, 'stored_bytes': 0}
+    return {
+        'total': stats_entry(total or empty, None),
+        'by_day': by_day,
+        'by_uploader': by_uploader,
+        'by_format': by_format,
+    }
 
 
 def save_to_history(download_id, url, title, thumbnail, uploader, duration, 
-                   quality, format_type, audio_format, filename, filesize, status, error=None):
+                   quality, format_type, audio_format, filename, filesize, status, error=None,
+                   playlist_title=None):
     """Save download to history database"""
     try:
         conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO download_history 
-            (id, url, title, thumbnail, uploader, duration, quality, format_type, 
-             audio_format, filename, filesize, status, error, completed_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (download_id, url, title, thumbnail, uploader, duration, quality, 
-              format_type, audio_format, filename, filesize, status, error,
-              datetime.now().isoformat() if status == 'completed' else None))
-        conn.commit()
+        conn.row_factory = sqlite3.Row
+        with conn:
+            # A retried job rewrites its row, so take the old one out of the aggregates first
+            cursor = conn.execute(f'SELECT {STATS_COLUMNS} FROM download_history WHERE id = ?', (download_id,))
+            apply_history_stats(conn, cursor.fetchall(), -1)
+            if status == 'completed' and filename:
+                # A repeat download overwrote the file an older row counts as stored
+                cursor = conn.execute(f'''
+                    SELECT id, {STATS_COLUMNS} FROM download_history
+                    WHERE filename = ? AND stored = 1 AND id != ?
+                ''', (filename, download_id))
+                rows = cursor.fetchall()
+                apply_history_stats(conn, rows, -1)
+                conn.executemany('UPDATE download_history SET stored = 0 WHERE id = ?', [(row['id'],) for row in rows])
+                apply_history_stats(conn, [{**dict(row), 'stored': 0} for row in rows], 1)
+            conn.execute('''
+                INSERT OR REPLACE INTO download_history 
+                (id, url, title, thumbnail, uploader, duration, quality, format_type, 
+                 audio_format, filename, filesize, status, error, completed_at, playlist_title, stored)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (download_id, url, title, thumbnail, uploader, duration, quality, 
+                  format_type, audio_format, filename, filesize, status, error,
+                  datetime.now().isoformat() if status == 'completed' else None,
+                  playlist_title or None, int(status == 'completed')))
+            cursor = conn.execute(f'SELECT {STATS_COLUMNS} FROM download_history WHERE id = ?', (download_id,))
+            apply_history_stats(conn, cursor.fetchall(), 1)
         conn.close()
     except Exception as e:
         print(f"Error saving to history: {e}")
 
 
-def get_history(limit=50, offset=0, search=''):
-    """Get download history from database"""
+# Job journal: every job spec is written here before its thread starts and
+# its last-known progress is flushed periodically, so jobs interrupted by a
+# crash or restart can be re-registered and resumed from their .part files.
+# Rows are removed once a job completes or fails (history takes over).
+JOURNAL_FIELDS = [
+    'url', 'quality', 'audio_only', 'audio_format', 'download_subs', 'sub_lang', 'embed_subs',
+    'is_playlist', 'playlist_index', 'playlist_count', 'playlist_title',
+    'title', 'thumbnail', 'filename', 'progress', 'retry_count', 'batch_id', 'window', 'rate_limit'
+]
+
+
+def write_jobs(conn, jobs):
+    """Insert job specs on an open connection"""
+    now = time.time()
+    conn.executemany(f'''
+        INSERT OR REPLACE INTO download_jobs (id, {', '.join(JOURNAL_FIELDS)}, created_at, updated_at)
+        VALUES ({', '.join('?' * (len(JOURNAL_FIELDS) + 3))})
+    ''', [(job['id'], *[job[f] for f in JOURNAL_FIELDS], now, now) for job in jobs])
+
+
+def journal_jobs(jobs):
+    """Write the specs of newly registered downloads in one transaction"""
+    if not jobs:
+        return
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        write_jobs(conn, jobs)
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Error writing job journal: {e}")
+
+
+def journal_progress(download_id, title, filename, progress):
+    """Record the last-known progress of a journaled download"""
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute('''
+            UPDATE download_jobs SET title = ?, filename = ?, progress = ?, updated_at = ? WHERE id = ?
+        ''', (title, filename, progress, time.time(), download_id))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Error updating job journal: {e}")
+
+
+def journal_remove(download_id):
+    """Drop a finished download from the journal"""
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute('DELETE FROM download_jobs WHERE id = ?', (download_id,))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Error updating job journal: {e}")
+
+
+def load_journal():
+    """Read every job left in the journal"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM download_jobs ORDER BY created_at')
+    rows = cursor.fetchall()
+    conn.close()
+    return [dict(row) for row in rows]
+
+
+def get_history(limit=50, offset=0, search='', fields=None):
+    """Get download history from database (optionally only the given columns)"""
     try:
         conn = sqlite3.connect(DATABASE_PATH)
         conn.row_factory = sqlite3.Row
         cursor = conn.cursor()
         
+        # Only whitelisted column names ever reach the SQL string
+        columns = [c for c in (fields or []) if c in HISTORY_COLUMNS] or HISTORY_COLUMNS
+        select = ', '.join(columns)
+        
         if search:
-            cursor.execute('''
-                SELECT * FROM download_history 
+            cursor.execute(f'''
+                SELECT {select} FROM download_history 
                 WHERE title LIKE ? OR url LIKE ?
                 ORDER BY created_at DESC LIMIT ? OFFSET ?
             ''', (f'%{search}%', f'%{search}%', limit, offset))
         else:
-            cursor.execute('''
-                SELECT * FROM download_history 
+            cursor.execute(f'''
+                SELECT {select} FROM download_history 
                 ORDER BY created_at DESC LIMIT ? OFFSET ?
             ''', (limit, offset))
         
@@ -108,6 +661,245 @@ def get_history(limit=50, offset=0, search=''):
         return []
 
 
+def count_history(search=''):
+    """Number of history rows matching a search, for paging"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    if search:
+        cursor.execute('SELECT COUNT(*) FROM download_history WHERE title LIKE ? OR url LIKE ?',
+                       (f'%{search}%', f'%{search}%'))
+    else:
+        cursor.execute('SELECT COUNT(*) FROM download_history')
+    total = cursor.fetchone()[0]
+    conn.close()
+    return total
+
+
+# Library index: every finished file is recorded here under its base name
+# (its key), which is what the API uses to refer to it. File endpoints look
+# the key up instead of joining user input onto DOWNLOAD_FOLDER, so files can
+# live in any subfolder of the layout.
+def library_outtmpl(layout=None):
+    """Absolute yt-dlp output template for a storage layout"""
+    return os.path.join(DOWNLOAD_FOLDER, STORAGE_LAYOUTS[layout or STORAGE_LAYOUT])
+
+
+def walk_library():
+    """Absolute paths of all files under the download folder, except caches"""
+    skip = {os.path.abspath(THUMBNAILS_FOLDER), os.path.abspath(SUBTITLES_FOLDER)}
+    for root, dirs, names in os.walk(DOWNLOAD_FOLDER):
+        dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) not in skip]
+        for name in names:
+            yield os.path.join(root, name)
+
+
+def prune_empty_dirs(path):
+    """Remove the now empty shard folders a deleted file lived in"""
+    folder = os.path.dirname(os.path.abspath(path))
+    top = os.path.abspath(DOWNLOAD_FOLDER)
+    while folder != top and folder.startswith(top + os.sep):
+        try:
+            os.rmdir(folder)
+        except OSError:
+            return  # Not empty
+        folder = os.path.dirname(folder)
+
+
+def index_library_file(path, title='', extractor='', video_id='', uploader='', uploader_id='',
+                       upload_date='', download_id='', key=''):
+    """Add (or refresh) a file in the library index, under its base name unless a key is given"""
+    try:
+        stat = os.stat(path)
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute('''
+            INSERT OR REPLACE INTO library_files
+            (key, path, title, extractor, video_id, uploader, uploader_id, upload_date, size, mtime,
+             download_id, added_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (key or os.path.basename(path), os.path.relpath(path, DOWNLOAD_FOLDER), title, extractor, video_id,
+              uploader, uploader_id, upload_date, stat.st_size, stat.st_mtime, download_id, time.time()))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Error indexing {path}: {e}")
+
+
+def get_library_file(key):
+    """Index entry of a library file with its absolute path, or None if it is gone"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM library_files WHERE key = ?', (key,))
+    row = cursor.fetchone()
+    conn.close()
+    if row is None:
+        return None
+    
+    # The index only ever points inside the download folder
+    top = os.path.realpath(DOWNLOAD_FOLDER)
+    path = os.path.realpath(os.path.join(top, row['path']))
+    if not path.startswith(top + os.sep) or not os.path.isfile(path):
+        return None
+    return {**dict(row), 'abspath': path}
+
+
+def library_download_name(entry):
+    """Name a library file is offered to users under: its title, not its id"""
+    title = sanitize_filename(entry['title'] or '').strip()
+    if not title:
+        return entry['key']
+    return title + os.path.splitext(entry['key'])[1]
+
+
+def content_disposition(filename):
+    """Attachment header for any filename: an ASCII fallback plus the RFC 5987 UTF-8 form"""
+    fallback = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+    fallback = fallback.replace('\\', '_').replace('"', "'").strip()
+    if not fallback or fallback.startswith('.'):
+        fallback = 'download' + fallback  # Nothing of the name survived, keep the extension
+    if fallback == filename:
+        return f'attachment; filename="{fallback}"'
+    quoted = urllib.parse.quote(filename, safe='')
+    return f'attachment; filename="{fallback}"; filename*=UTF-8\'\'{quoted}'
+
+
+def unique_library_key(name, taken):
+    """name, or "stem (n).ext" for the first n that no other indexed file uses"""
+    stem, ext = os.path.splitext(name)
+    key, n = name, 1
+    while key in taken:
+        n += 1
+        key = f'{stem} ({n}){ext}'
+    return key
+
+
+def sync_library_index():
+    """Bring the index in line with the files on disk, returns (added, removed)
+    
+    Files are matched by path. A file whose base name is already the key of
+    another file is indexed under a numbered key rather than left out.
+    """
+    on_disk = [os.path.relpath(path, DOWNLOAD_FOLDER) for path in walk_library()
+               if not is_partial_file(os.path.basename(path))]
+    
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute('SELECT key, path FROM library_files')
+    indexed = {row['path']: row['key'] for row in cursor.fetchall()}
+    
+    missing = [key for path, key in indexed.items() if not os.path.isfile(os.path.join(DOWNLOAD_FOLDER, path))]
+    unindexed = sorted(path for path in on_disk if path not in indexed)
+    names = list({os.path.basename(path) for path in unindexed})
+    history = {}
+    for chunk in range(0, len(names), 500):
+        keys = names[chunk:chunk + 500]
+        cursor.execute(f'''
+            SELECT filename, title, uploader FROM download_history
+            WHERE filename IN ({', '.join('?' * len(keys))}) ORDER BY created_at
+        ''', keys)
+        history.update({row['filename']: row for row in cursor.fetchall()})
+    conn.close()
+    
+    for key in missing:
+        forget_library_file(key)
+    taken = set(indexed.values()) - set(missing)
+    for path in unindexed:
+        name = os.path.basename(path)
+        key = unique_library_key(name, taken)
+        if key != name:
+            print(f"Library file {path} has the same name as another file, indexed as {key}")
+        taken.add(key)
+        row = history.get(name)
+        index_library_file(os.path.join(DOWNLOAD_FOLDER, path),
+                           title=row['title'] if row else os.path.splitext(name)[0],
+                           uploader=row['uploader'] if row else '', key=key)
+    if any(os.path.basename(path) in history for path in unindexed):
+        # Their history rows now count as stored
+        rebuild_history_stats()
+    return len(unindexed), len(missing)
+
+
+def identify_video(url):
+    """(extractor key, video id) of a URL, worked out without network access"""
+    for ie in yt_dlp.extractor.gen_extractor_classes():
+        if ie.ie_key() != 'Generic' and ie.suitable(url):
+            try:
+                return ie.ie_key(), ie.get_temp_id(url)
+            except Exception:
+                break
+    return None, None
+
+
+def migrate_library(layout=None, dry_run=False):
+    """Move library files into a storage layout, returns (moved, skipped)
+    
+    Identity for files from before the index comes from their history row.
+    Files that can't be identified stay where they are.
+    """
+    layout = layout or STORAGE_LAYOUT
+    added, removed = sync_library_index()
+    print(f"Index: {added} file(s) added, {removed} missing file(s) dropped")
+    
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM library_files')
+    entries = [dict(row) for row in cursor.fetchall()]
+    
+    moved = skipped = 0
+    ydl = yt_dlp.YoutubeDL({'outtmpl': library_outtmpl(layout), 'quiet': True})
+    for entry in entries:
+        key = entry['key']
+        if not (entry['extractor'] and entry['video_id']):
+            cursor.execute('''
+                SELECT url FROM download_history WHERE filename = ? ORDER BY created_at DESC LIMIT 1
+            ''', (key,))
+            row = cursor.fetchone()
+            if row:
+                entry['extractor'], entry['video_id'] = identify_video(row['url'])
+        if layout != 'flat' and not (entry['extractor'] and entry['video_id']):
+            print(f"Skipping {key}: unknown video id")
+            skipped += 1
+            continue
+        
+        source = os.path.join(DOWNLOAD_FOLDER, entry['path'])
+        target = ydl.prepare_filename({
+            'id': entry['video_id'],
+            'extractor_key': entry['extractor'],
+            'extractor': (entry['extractor'] or '').lower(),
+            'title': entry['title'] or os.path.splitext(key)[0],
+            'uploader': entry['uploader'] or None,
+            'uploader_id': entry['uploader_id'] or None,
+            'upload_date': entry['upload_date'] or None,
+            'ext': os.path.splitext(key)[1].lstrip('.'),
+        })
+        new_key = os.path.basename(target)
+        if os.path.abspath(target) == os.path.abspath(source):
+            continue
+        cursor.execute('SELECT 1 FROM library_files WHERE key = ?', (new_key,))
+        if os.path.exists(target) or (new_key != key and cursor.fetchone()):
+            print(f"Skipping {key}: {os.path.relpath(target, DOWNLOAD_FOLDER)} already exists")
+            skipped += 1
+            continue
+        
+        print(f"{key} -> {os.path.relpath(target, DOWNLOAD_FOLDER)}")
+        moved += 1
+        if dry_run:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(source, target)
+        prune_empty_dirs(source)
+        with conn:
+            conn.execute('''
+                UPDATE library_files SET key = ?, path = ?, extractor = ?, video_id = ? WHERE key = ?
+            ''', (new_key, os.path.relpath(target, DOWNLOAD_FOLDER), entry['extractor'], entry['video_id'], key))
+            conn.execute('UPDATE download_history SET filename = ? WHERE filename = ?', (new_key, key))
+            conn.execute('UPDATE file_access SET filename = ? WHERE filename = ?', (new_key, key))
+    conn.close()
+    return moved, skipped
+
+
 # Initialize database on startup
 init_database()
 
@@ -117,83 +909,448 @@ def sanitize_filename(filename):
     return re.sub(r'[<>:"/\\|?*]', '', filename)
 
 
-class DownloadProgress:
-    """Track download progress"""
-    def __init__(self, download_id, url='', quality='best', audio_only=False, audio_format='mp3', 
-                 download_subs=False, sub_lang='en', embed_subs=False, is_playlist=False):
-        self.download_id = download_id
-        self.progress = 0
-        self.status = 'pending'
-        self.filename = ''
-        self.title = ''
-        self.speed = ''
-        self.eta = ''
-        self.filesize = ''
-        self.error = ''
-        self.warning = ''  # For non-fatal issues like subtitle failures
-        self.current_stream = 0  # Track which stream we're downloading (0=video, 1=audio)
-        self.stream_progress = [0, 0]  # Progress for each stream
-        self.total_streams = 1  # Will be set to 2 for video+audio
-        self.is_merging = False
-        # Store parameters for resume capability
-        self.url = url
-        self.quality = quality
-        self.audio_only = audio_only
-        self.audio_format = audio_format
-        self.retry_count = 0
-        self.max_retries = 3
-        # New features
-        self.download_subs = download_subs
-        self.sub_lang = sub_lang
-        self.embed_subs = embed_subs
-        self.thumbnail = ''
-        self.uploader = ''
-        self.duration = 0
-        # Playlist support
-        self.is_playlist = is_playlist
-        self.playlist_index = 0
-        self.playlist_count = 0
-        self.playlist_title = ''
+def parse_fields(value):
+    """Parse a fields= parameter (comma separated string or list) into a list of keys"""
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    fields = [str(f).strip() for f in value if str(f).strip()]
+    return fields or None
 
-    def reset_for_retry(self):
-        """Reset progress state for a retry attempt"""
-        self.progress = 0
-        self.status = 'pending'
-        self.speed = ''
-        self.eta = ''
-        self.error = ''
-        self.warning = ''
-        self.current_stream = 0
-        self.stream_progress = [0, 0]
-        self.is_merging = False
-        self.retry_count += 1
 
-    def to_dict(self):
-        return {
-            'id': self.download_id,
-            'progress': self.progress,
-            'status': self.status,
-            'filename': self.filename,
-            'title': self.title,
-            'speed': self.speed,
-            'eta': self.eta,
-            'filesize': self.filesize,
-            'error': self.error,
-            'warning': self.warning,
-            'is_merging': self.is_merging,
-            'can_retry': self.status == 'error' and self.retry_count < self.max_retries,
-            'retry_count': self.retry_count,
-            'url': self.url,
-            'thumbnail': self.thumbnail,
-            'is_playlist': self.is_playlist,
-            'playlist_index': self.playlist_index,
-            'playlist_count': self.playlist_count,
-            'playlist_title': self.playlist_title
-        }
+def project_fields(data, fields):
+    """Keep only the requested top-level keys of a response dict"""
+    if not fields:
+        return data
+    return {key: data[key] for key in fields if key in data}
 
 
-def progress_hook(d, download_id):
+# Thumbnail cache: remote thumbnail URLs are registered under a stable key,
+# fetched once on first request, stored by content hash (so identical images
+# are kept once) and resized into small WebP/JPEG variants on demand.
+# Registering writes to the database, so it happens where metadata comes in
+# (never under download_lock); building the local URL is a pure computation.
+# Only URLs from the server's own extraction are registered: the cache fetches
+# whatever it is given, so a client-supplied URL would make it an open proxy.
+thumbnail_keys = collections.OrderedDict()  # Recently registered keys, LRU bounded
+thumbnail_fetch_locks = {}  # key -> [lock, requests using it], dropped when unused
+thumbnail_lock = threading.Lock()
+
+
+def is_remote_thumbnail(url):
+    """Whether a thumbnail is a remote URL the cache can serve"""
+    return isinstance(url, str) and url.startswith(('http://', 'https://'))
+
+
+def thumbnail_key(url):
+    """Stable cache key of a remote thumbnail URL"""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()[:32]
+
+
+def register_thumbnails(*urls):
+    """Make remote thumbnails servable from the local cache"""
+    new = []
+    with thumbnail_lock:
+        for url in urls:
+            if not is_remote_thumbnail(url):
+                continue
+            key = thumbnail_key(url)
+            if key in thumbnail_keys:
+                thumbnail_keys.move_to_end(key)
+            else:
+                new.append((key, url))
+    if not new:
+        return
+    
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.executemany('INSERT OR IGNORE INTO thumbnail_cache (key, url) VALUES (?, ?)', new)
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Error registering thumbnails: {e}")
+        return
+    with thumbnail_lock:
+        for key, _ in new:
+            thumbnail_keys[key] = None
+        while len(thumbnail_keys) > THUMBNAIL_KEYS_CACHE_SIZE:
+            thumbnail_keys.popitem(last=False)
+
+
+def registered_thumbnails(urls):
+    """The subset of urls already registered by a server-side extraction"""
+    keys = {thumbnail_key(url): url for url in urls if is_remote_thumbnail(url)}
+    if not keys:
+        return set()
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.execute(f'''
+        SELECT key FROM thumbnail_cache WHERE key IN ({', '.join('?' * len(keys))})
+    ''', list(keys))
+    found = {keys[row[0]] for row in cursor.fetchall()}
+    conn.close()
+    return found
+
+
+def thumbnail_url(url, size='medium'):
+    """Local URL serving a remote thumbnail registered with register_thumbnails()"""
+    if not is_remote_thumbnail(url):
+        return url
+    return f'/api/thumb/{thumbnail_key(url)}?size={size}'
+
+
+@contextlib.contextmanager
+def thumbnail_fetch_lock(key):
+    """Per-key lock so concurrent requests for one thumbnail fetch it only once"""
+    with thumbnail_lock:
+        entry = thumbnail_fetch_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with thumbnail_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del thumbnail_fetch_locks[key]
+
+
+def fetch_thumbnail(url):
+    """Download a remote thumbnail and store the original by content hash"""
+    req = urllib.request.Request(url, headers={'User-Agent': 'Mozilla/5.0'})
+    with urllib.request.urlopen(req, timeout=THUMBNAIL_FETCH_TIMEOUT) as resp:
+        data = resp.read(THUMBNAIL_MAX_FETCH_BYTES + 1)
+    if len(data) > THUMBNAIL_MAX_FETCH_BYTES:
+        raise ValueError('Thumbnail too large')
+    content_hash = hashlib.sha256(data).hexdigest()
+    original_path = os.path.join(THUMBNAILS_FOLDER, f'{content_hash}.orig')
+    if not os.path.exists(original_path):
+        tmp_path = original_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, original_path)
+    return content_hash
+
+
+def build_thumbnail_variant(content_hash, size, use_webp):
+    """Create a resized variant of a cached thumbnail, returning its path"""
+    original_path = os.path.join(THUMBNAILS_FOLDER, f'{content_hash}.orig')
+    if Image is None:
+        return original_path
+    
+    ext = 'webp' if use_webp else 'jpg'
+    variant_path = os.path.join(THUMBNAILS_FOLDER, f'{content_hash}_{size}.{ext}')
+    if os.path.exists(variant_path):
+        return variant_path
+    
+    with Image.open(original_path) as img:
+        img = img.convert('RGB')
+        width = THUMBNAIL_SIZES[size]
+        if img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        tmp_path = variant_path + '.tmp'
+        img.save(tmp_path, format='WEBP' if use_webp else 'JPEG', quality=80)
+    os.replace(tmp_path, variant_path)
+    return variant_path
+
+
+def get_image_mimetype(path):
+    """Detect an image mimetype from its magic bytes (originals have no extension)"""
+    with open(path, 'rb') as f:
+        head = f.read(12)
+    if head.startswith(b'\xff\xd8'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG'):
+        return 'image/png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    return 'application/octet-stream'
+
+
+def get_thumbnail_files(content_hash):
+    """Cached files (original and variants) belonging to a content hash"""
+    # Variant names are fixed, so they are probed instead of listing the folder
+    names = [f'{content_hash}.orig'] + [f'{content_hash}_{size}.{ext}'
+                                         for size in THUMBNAIL_SIZES for ext in ('webp', 'jpg')]
+    paths = [os.path.join(THUMBNAILS_FOLDER, name) for name in names]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def evict_thumbnails():
+    """Evict least recently used thumbnails until the cache fits its size bound"""
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT content_hash, MAX(bytes), MAX(last_access) AS accessed FROM thumbnail_cache
+            WHERE content_hash IS NOT NULL GROUP BY content_hash ORDER BY accessed ASC
+        ''')
+        rows = cursor.fetchall()
+        total = sum(row[1] or 0 for row in rows)
+        for content_hash, size, _ in rows:
+            if total <= THUMBNAIL_CACHE_MAX_BYTES:
+                break
+            for path in get_thumbnail_files(content_hash):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            # Keep the URL mapping so the thumbnail can be fetched again later
+            cursor.execute('''
+                UPDATE thumbnail_cache SET content_hash = NULL, bytes = 0 WHERE content_hash = ?
+            ''', (content_hash,))
+            total -= size or 0
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Error evicting thumbnails: {e}")
+
+
+def get_cached_thumbnail(key, size, use_webp):
+    """Return the path of a thumbnail variant, fetching and resizing it if needed"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute('SELECT url, content_hash FROM thumbnail_cache WHERE key = ?', (key,))
+    row = cursor.fetchone()
+    conn.close()
+    if not row:
+        return None
+    url, content_hash = row
+    
+    with thumbnail_fetch_lock(key):
+        original_path = os.path.join(THUMBNAILS_FOLDER, f'{content_hash}.orig') if content_hash else None
+        fetched = False
+        if not original_path or not os.path.exists(original_path):
+            content_hash = fetch_thumbnail(url)
+            fetched = True
+        path = build_thumbnail_variant(content_hash, size, use_webp)
+        size_bytes = sum(os.path.getsize(p) for p in get_thumbnail_files(content_hash))
+    
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.execute('''
+        UPDATE thumbnail_cache SET content_hash = ?, bytes = ?, last_access = ? WHERE key = ?
+    ''', (content_hash, size_bytes, time.time(), key))
+    conn.commit()
+    conn.close()
+    
+    if fetched:
+        evict_thumbnails()
+    return path
+
+
+def get_format_filesize(f):
+    """Exact filesize of a yt-dlp format, falling back to the approximate one"""
+    return f.get('filesize') or f.get('filesize_approx') or 0
+
+
+def summarize_formats(formats):
+    """Collapse yt-dlp formats into the quality ladder the UI picker can use"""
+    video = [f for f in formats if f.get('vcodec') not in (None, 'none') and f.get('height')]
+    audio = [f for f in formats if f.get('vcodec') == 'none' and f.get('acodec') not in (None, 'none')]
+    best_audio = max(audio, key=lambda f: (f.get('ext') == 'm4a', f.get('abr') or f.get('tbr') or 0), default=None)
+    
+    ladder = []
+    for i, height in enumerate(QUALITY_LADDER):
+        lower = QUALITY_LADDER[i + 1] if i + 1 < len(QUALITY_LADDER) else 0
+        candidates = [f for f in video if lower < f['height'] <= height]
+        if not candidates:
+            continue  # This rung would select the same stream as the one below it
+        # Same preference order as the download format strings: mp4 first, then bitrate
+        best = max(candidates, key=lambda f: (f['height'], f.get('ext') == 'mp4', f.get('tbr') or 0))
+        needs_merge = best.get('acodec') in (None, 'none') and best_audio is not None
+        filesize = get_format_filesize(best)
+        if needs_merge and filesize:
+            filesize += get_format_filesize(best_audio)
+        ladder.append({
+            'quality': str(height),
+            'height': best['height'],
+            'ext': best.get('ext', ''),
+            'fps': best.get('fps', 0),
+            'vcodec': best.get('vcodec', 'none'),
+            'needs_merge': needs_merge,
+            'filesize': filesize,
+        })
+    
+    return {
+        'video': ladder,
+        'audio': {
+            'ext': best_audio.get('ext', ''),
+            'acodec': best_audio.get('acodec', 'none'),
+            'abr': best_audio.get('abr', 0),
+            'filesize': get_format_filesize(best_audio),
+        } if best_audio else None,
+    }
+
+
+class DownloadProgress:
+    """Track download progress"""
+    def __init__(self, download_id, url='', quality='best', audio_only=False, audio_format='mp3', 
+                 download_subs=False, sub_lang='en', embed_subs=False, is_playlist=False):
+        self.download_id = download_id
+        self.progress = 0
+        self.status = 'pending'
+        self.filename = ''
+        self.title = ''
+        self.speed = ''
+        self.eta = ''
+        self.filesize = ''
+        self.error = ''
+        self.warning = ''  # For non-fatal issues like subtitle failures
+        self.current_stream = 0  # Track which stream we're downloading (0=video, 1=audio)
+        self.stream_progress = [0, 0]  # Progress for each stream
+        self.total_streams = 1  # Will be set to 2 for video+audio
+        self.is_merging = False
+        # Store parameters for resume capability
+        self.url = url
+        self.quality = quality
+        self.audio_only = audio_only
+        self.audio_format = audio_format
+        self.retry_count = 0
+        self.max_retries = 3
+        # New features
+        self.download_subs = download_subs
+        self.sub_lang = sub_lang
+        self.embed_subs = embed_subs
+        self.thumbnail = ''
+        self.uploader = ''
+        self.duration = 0
+        # Identity used to place the file in the library
+        self.extractor = ''
+        self.video_id = ''
+        self.uploader_id = ''
+        self.upload_date = ''
+        self.filepath = ''  # Final path, once yt-dlp has finished post-processing
+        # Playlist support
+        self.is_playlist = is_playlist
+        self.playlist_index = 0
+        self.playlist_count = 0
+        self.playlist_title = ''
+        # Stream-while-downloading support
+        self.tmpfilename = ''  # Full path of the file yt-dlp is writing
+        self.total_bytes = 0  # Exact size when the site reports it
+        self.streams_finished = 0
+        # Bulk batch this job belongs to, if any
+        self.batch_id = ''
+        self.holds_queue_slot = False
+        # Scheduling: window the job was released into and its share of the window's bandwidth
+        self.window = ''
+        self.rate_limit = 0
+        self.scheduled_for = 0
+        # Automatic retry state
+        self.host = get_host(url)
+        self.auto_retry_count = 0
+        self.error_kind = ''
+        self.last_error = ''
+        self.next_retry_at = 0
+        # Job journal bookkeeping
+        self.resumed = False
+        self.journal_flushed_at = 0
+        self.journaled_filename = ''
+
+    def journal_entry(self):
+        """Job spec and last-known progress as stored in the job journal"""
+        entry = {field: getattr(self, field) for field in JOURNAL_FIELDS}
+        entry['id'] = self.download_id
+        return entry
+
+    def reset_for_retry(self, manual=True):
+        """Reset progress state for a retry attempt (manual or automatic)"""
+        self.progress = 0
+        self.status = 'pending'
+        self.speed = ''
+        self.eta = ''
+        self.error = ''
+        self.warning = ''
+        self.current_stream = 0
+        self.stream_progress = [0, 0]
+        self.is_merging = False
+        self.tmpfilename = ''
+        self.total_bytes = 0
+        self.streams_finished = 0
+        if manual:
+            self.retry_count += 1
+            # A manual retry gets a fresh automatic retry budget
+            self.auto_retry_count = 0
+        else:
+            self.auto_retry_count += 1
+
+    def to_dict(self):
+        return {
+            'id': self.download_id,
+            'progress': self.progress,
+            'status': self.status,
+            'filename': self.filename,
+            'title': self.title,
+            'speed': self.speed,
+            'eta': self.eta,
+            'filesize': self.filesize,
+            'error': self.error,
+            'warning': self.warning,
+            'is_merging': self.is_merging,
+            'can_retry': self.status == 'error' and self.retry_count < self.max_retries,
+            'retry_count': self.retry_count,
+            'url': self.url,
+            'thumbnail': self.thumbnail,
+            'thumbnail_url': thumbnail_url(self.thumbnail, 'small'),
+            'is_playlist': self.is_playlist,
+            'playlist_index': self.playlist_index,
+            'playlist_count': self.playlist_count,
+            'playlist_title': self.playlist_title,
+            'resumed': self.resumed,
+            'batch_id': self.batch_id,
+            'can_stream': self.total_streams == 1 and bool(self.tmpfilename)
+                          and self.status in ['downloading', 'processing', 'completed'],
+            'host': self.host,
+            'circuit_state': host_breakers.state(self.host),
+            'error_kind': self.error_kind,
+            'last_error': self.last_error,
+            'auto_retry_count': self.auto_retry_count,
+            'next_retry_in': round(max(0, self.next_retry_at - time.time()), 1)
+                             if self.status in ['retrying', 'waiting'] else 0,
+            'window': self.window,
+            'scheduled_for': datetime.fromtimestamp(self.scheduled_for).isoformat()
+                             if self.status == 'scheduled' else None
+        }
+
+
+def is_subtitle_event(d):
+    """Whether a progress event belongs to a subtitle file rather than a media stream"""
+    info = d.get('info_dict') or {}
+    ext = os.path.splitext(d.get('filename') or '')[1].lstrip('.').lower()
+    return ext in SUBTITLE_EXTENSIONS or (info.get('ext') in SUBTITLE_EXTENSIONS and not info.get('format_id'))
+
+
+def progress_hook(d, download_id):
     """Hook to track download progress - handles multi-stream downloads"""
+    # Subtitles must not become the streamed file or count as a finished stream
+    if is_subtitle_event(d):
+        return
+    update_progress(d, download_id)
+    if d.get('downloaded_bytes'):
+        storage_manager.record_written(download_id, d.get('filename'), d['downloaded_bytes'])
+    flush_progress_to_journal(download_id)
+
+
+def flush_progress_to_journal(download_id):
+    """Write progress to the job journal when the file changed or the interval passed"""
+    with download_lock:
+        if download_id not in downloads:
+            return
+        dl = downloads[download_id]
+        now = time.time()
+        if dl.filename == dl.journaled_filename and now - dl.journal_flushed_at < JOURNAL_FLUSH_INTERVAL:
+            return
+        dl.journal_flushed_at = now
+        dl.journaled_filename = dl.filename
+        title, filename, progress = dl.title, dl.filename, dl.progress
+    # Written outside the lock so other jobs' hooks are not held up by the database
+    journal_progress(download_id, title, filename, progress)
+
+
+def update_progress(d, download_id):
+    """Apply a yt-dlp progress event to the download's tracker"""
     with download_lock:
         if download_id not in downloads:
             return
@@ -262,10 +1419,17 @@ def progress_hook(d, download_id):
             
             if 'filename' in d:
                 download.filename = os.path.basename(d['filename'])
+            
+            # Remember where the bytes are landing so clients can stream them
+            if d.get('tmpfilename'):
+                download.tmpfilename = d['tmpfilename']
+            if d.get('total_bytes'):
+                download.total_bytes = d['total_bytes']
                 
         elif d['status'] == 'finished':
             # Stream finished - check if there are more streams
             download.stream_progress[download.current_stream] = 100
+            download.streams_finished += 1
             
             if download.current_stream < download.total_streams - 1:
                 # Move to next stream
@@ -296,96 +1460,382 @@ def progress_hook(d, download_id):
                 download.error = str(d['error'])
 
 
-def get_video_info(url):
-    """Get video information without downloading"""
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True,
-        'extract_flat': 'in_playlist',  # Get playlist info without downloading each video
-    }
+class HostPace:
+    """Learned request rate of one host"""
+    def __init__(self, rate=PACER_INITIAL_RATE):
+        self.rate = rate  # Requests per second
+        self.next_at = 0
+        self.dirty = False
+
+
+class HostPacer:
+    """Shared AIMD request pacing per host
     
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=False)
-        
-        # Check if it's a playlist
-        is_playlist = info.get('_type') == 'playlist' or 'entries' in info
-        
-        if is_playlist:
-            entries = list(info.get('entries', []))
-            return {
-                'is_playlist': True,
-                'playlist_title': info.get('title', 'Playlist'),
-                'playlist_id': info.get('id', ''),
-                'playlist_count': len(entries),
-                'uploader': info.get('uploader', 'Unknown'),
-                'thumbnail': info.get('thumbnail', '') or (entries[0].get('thumbnail', '') if entries else ''),
-                'entries': [{
-                    'id': e.get('id', ''),
-                    'title': e.get('title', 'Unknown'),
-                    'url': e.get('url', '') or e.get('webpage_url', ''),
-                    'thumbnail': e.get('thumbnail', ''),
-                    'duration': e.get('duration', 0),
-                    'uploader': e.get('uploader', info.get('uploader', 'Unknown')),
-                } for e in entries[:50] if e]  # Limit to first 50 videos
-            }
-        
-        # Single video - get full details
-        ydl_opts_full = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-        }
-        
-        with yt_dlp.YoutubeDL(ydl_opts_full) as ydl_full:
-            info = ydl_full.extract_info(url, download=False)
-        
-        # Get available formats
-        formats = []
-        if 'formats' in info:
-            for f in info['formats']:
-                format_info = {
-                    'format_id': f.get('format_id', ''),
-                    'ext': f.get('ext', ''),
-                    'resolution': f.get('resolution', 'audio only'),
-                    'filesize': f.get('filesize', 0),
-                    'vcodec': f.get('vcodec', 'none'),
-                    'acodec': f.get('acodec', 'none'),
-                    'format_note': f.get('format_note', ''),
-                    'fps': f.get('fps', 0),
-                    'tbr': f.get('tbr', 0),
-                }
-                formats.append(format_info)
-        
-        # Get available subtitles
-        subtitles = {}
-        if 'subtitles' in info:
-            for lang, subs in info['subtitles'].items():
-                subtitles[lang] = {
-                    'name': get_language_name(lang),
-                    'formats': [s.get('ext', 'vtt') for s in subs]
-                }
-        if 'automatic_captions' in info:
-            for lang, subs in info['automatic_captions'].items():
-                if lang not in subtitles:
-                    subtitles[lang] = {
-                        'name': get_language_name(lang) + ' (auto)',
-                        'formats': [s.get('ext', 'vtt') for s in subs],
-                        'auto': True
-                    }
-        
+    Every YoutubeDL consults the pacer before each page and API request, so
+    the spacing applies to a host as a whole rather than to each job. Media
+    and fragment downloads are not paced (see PacedYoutubeDL). The rate
+    grows additively while responses are healthy and is halved when the
+    host answers 429/503; learned rates are persisted across restarts.
+    """
+    def __init__(self):
+        self.hosts = {}
+        self.lock = threading.Lock()
+        self.saved_at = time.time()
+    
+    def _get(self, host):
+        if host not in self.hosts:
+            self.hosts[host] = HostPace()
+        return self.hosts[host]
+    
+    def wait(self, host):
+        """Block until the host's next request slot"""
+        if not host:
+            return
+        with self.lock:
+            pace = self._get(host)
+            now = time.time()
+            # Reserve a slot so concurrent jobs queue up behind each other
+            slot = max(now, pace.next_at)
+            pace.next_at = slot + 1.0 / pace.rate
+        if slot > now:
+            time.sleep(slot - now)
+    
+    def record(self, host, status=None, retry_after=None):
+        """Adjust a host's rate after a response (status None means success)"""
+        if not host:
+            return
+        with self.lock:
+            pace = self._get(host)
+            if status in PACER_BACKOFF_STATUSES:
+                pace.rate = max(PACER_MIN_RATE, pace.rate * PACER_DECREASE_FACTOR)
+                if retry_after:
+                    # Every thread opening this host waits it out, so a huge value must not stall them all
+                    retry_after = min(retry_after, PACER_MAX_RETRY_AFTER)
+                    pace.next_at = max(pace.next_at, time.time() + retry_after)
+            elif status is None or status < 400:
+                pace.rate = min(PACER_MAX_RATE, pace.rate + PACER_INCREASE_STEP)
+            else:
+                return
+            pace.dirty = True
+            save_due = time.time() - self.saved_at >= PACER_SAVE_INTERVAL
+        if save_due:
+            self.save()
+    
+    def load(self):
+        """Restore learned rates from the database"""
+        try:
+            conn = sqlite3.connect(DATABASE_PATH)
+            cursor = conn.cursor()
+            cursor.execute('SELECT host, rate FROM host_pacing')
+            rows = cursor.fetchall()
+            conn.close()
+        except Exception as e:
+            print(f"Error loading host pacing: {e}")
+            return
+        with self.lock:
+            for host, rate in rows:
+                self.hosts[host] = HostPace(min(PACER_MAX_RATE, max(PACER_MIN_RATE, rate)))
+    
+    def save(self):
+        """Persist rates that changed since the last save"""
+        with self.lock:
+            self.saved_at = time.time()
+            changed = [(host, pace.rate, self.saved_at) for host, pace in self.hosts.items() if pace.dirty]
+            for pace in self.hosts.values():
+                pace.dirty = False
+        if not changed:
+            return
+        try:
+            conn = sqlite3.connect(DATABASE_PATH)
+            conn.executemany('INSERT OR REPLACE INTO host_pacing (host, rate, updated_at) VALUES (?, ?, ?)', changed)
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"Error saving host pacing: {e}")
+
+
+host_pacer = HostPacer()
+host_pacer.load()
+
+
+def get_retry_after(error):
+    """Seconds from a Retry-After header on an HTTP error, if any"""
+    headers = getattr(error, 'headers', None)
+    if headers is None:
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None)
+    try:
+        return float(headers.get('Retry-After')) if headers else None
+    except (TypeError, ValueError):
+        return None  # HTTP-date form, the rate decrease alone will have to do
+
+
+class PacedYoutubeDL(yt_dlp.YoutubeDL):
+    """YoutubeDL whose page and API requests are paced by the shared host pacer
+    
+    Requests made while downloading media (every chunk and fragment goes
+    through urlopen) skip the wait: pacing them would cap throughput at the
+    host's request rate. Their errors still feed the pacer. Subtitles are
+    fetched through dl() as well but stay paced, they are the requests
+    sites rate limit.
+    """
+    downloading_media = False
+    
+    def dl(self, name, info, subtitle=False, *args, **kwargs):
+        """Download an entry's media with pacing suspended"""
+        if subtitle:
+            return super().dl(name, info, subtitle, *args, **kwargs)
+        self.downloading_media = True
+        try:
+            return super().dl(name, info, subtitle, *args, **kwargs)
+        finally:
+            self.downloading_media = False
+    
+    def urlopen(self, req):
+        url = req if isinstance(req, str) else getattr(req, 'url', None) or req.get_full_url()
+        host = get_host(url)
+        if not self.downloading_media:
+            host_pacer.wait(host)
+        try:
+            response = super().urlopen(req)
+        except Exception as e:
+            status = getattr(e, 'status', None) or getattr(e, 'code', None)
+            if isinstance(status, int):
+                host_pacer.record(host, status, get_retry_after(e))
+            raise
+        host_pacer.record(host)
+        return response
+
+
+class PooledYoutubeDL:
+    """A pooled YoutubeDL instance plus the download its hooks currently report to"""
+    def __init__(self, key, ydl_opts):
+        self.key = key
+        self.download_id = None
+        self.uses = 0
+        self.failed = False
+        self.last_used = time.time()
+        opts = dict(ydl_opts)
+        # Hooks are bound once and routed to whichever job holds the lease
+        opts['progress_hooks'] = [lambda d: progress_hook(d, self.download_id)]
+        opts['postprocessor_hooks'] = [lambda d: postprocessor_hook(d, self.download_id)]
+        opts['post_hooks'] = [lambda path: file_finished_hook(path, self.download_id)]
+        self.ydl = PacedYoutubeDL(opts)
+    
+    def reset(self, download_id):
+        """Prepare the instance for a new job"""
+        self.download_id = download_id
+        self.failed = False
+        self.uses += 1
+        # A previous job's error would otherwise leak into this job's return code
+        self.ydl._download_retcode = 0
+    
+    def close(self):
+        """Close the instance and its HTTP connections"""
+        try:
+            self.ydl.close()
+        except Exception as e:
+            print(f"Error closing YoutubeDL: {e}")
+
+
+class YoutubeDLPool:
+    """Warm YoutubeDL instances keyed by option profile
+    
+    Constructing a YoutubeDL sets up extractors, cookies and a request
+    director, and its HTTP connections are only reused while it stays alive.
+    Jobs lease an idle instance with identical options instead of building
+    their own; instances are recycled after YDL_POOL_MAX_USES leases, after
+    any job that failed on them, or when idle for too long.
+    """
+    def __init__(self, max_uses=YDL_POOL_MAX_USES, max_idle=YDL_POOL_MAX_IDLE, idle_timeout=YDL_POOL_IDLE_TIMEOUT):
+        self.max_uses = max_uses
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.idle = {}  # key -> [PooledYoutubeDL]
+        self.lock = threading.Lock()
+    
+    @staticmethod
+    def profile_key(profile, ydl_opts):
+        """Instances are only shared between jobs with identical options"""
+        return profile + ':' + json.dumps(ydl_opts, sort_keys=True, default=str)
+    
+    def checkout(self, profile, ydl_opts, download_id=None):
+        """Take an idle instance for this profile, or build a new one"""
+        key = self.profile_key(profile, ydl_opts)
+        entry = None
+        with self.lock:
+            idle = self.idle.get(key)
+            if idle:
+                entry = idle.pop()
+        if entry is None:
+            entry = PooledYoutubeDL(key, ydl_opts)
+        entry.reset(download_id)
+        return entry
+    
+    def checkin(self, entry):
+        """Return an instance to the pool, or close it if it should be recycled"""
+        entry.download_id = None
+        entry.last_used = time.time()
+        if not entry.failed and entry.uses < self.max_uses:
+            with self.lock:
+                idle = self.idle.setdefault(entry.key, [])
+                if len(idle) < self.max_idle:
+                    idle.append(entry)
+                    entry = None
+        if entry is not None:
+            entry.close()
+        self.prune()
+    
+    @contextlib.contextmanager
+    def lease(self, profile, ydl_opts, download_id=None):
+        """Context manager around checkout/checkin; errors recycle the instance"""
+        entry = self.checkout(profile, ydl_opts, download_id)
+        try:
+            yield entry
+        except BaseException:
+            entry.failed = True
+            raise
+        finally:
+            self.checkin(entry)
+    
+    def prewarm(self, profile, ydl_opts, count=1):
+        """Build instances ahead of the first job that needs them"""
+        for _ in range(count):
+            self.checkin(self.checkout(profile, ydl_opts))
+    
+    def prune(self):
+        """Close instances that have been idle longer than the timeout"""
+        now = time.time()
+        expired = []
+        with self.lock:
+            for key, idle in list(self.idle.items()):
+                keep = [e for e in idle if now - e.last_used < self.idle_timeout]
+                expired.extend(e for e in idle if now - e.last_used >= self.idle_timeout)
+                if keep:
+                    self.idle[key] = keep
+                else:
+                    del self.idle[key]
+        for entry in expired:
+            entry.close()
+
+
+ydl_pool = YoutubeDLPool()
+
+# Option profiles used by get_video_info
+INFO_FLAT_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'extract_flat': 'in_playlist',  # Get playlist info without downloading each video
+}
+INFO_FULL_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'extract_flat': False,
+}
+
+
+def prewarm_ydl_pool():
+    """Build the info instances up front so the first lookup doesn't pay for it"""
+    try:
+        ydl_pool.prewarm('info', INFO_FLAT_OPTS)
+        ydl_pool.prewarm('info', INFO_FULL_OPTS)
+    except Exception as e:
+        print(f"Error prewarming YoutubeDL pool: {e}")
+
+
+threading.Thread(target=prewarm_ydl_pool, daemon=True).start()
+
+
+def get_video_info(url, format_mode='full'):
+    """Get video information without downloading
+    
+    format_mode: 'full' lists every format, 'ladder' returns a compact
+    per-quality summary instead, 'none' omits formats entirely.
+    """
+    with ydl_pool.lease('info', INFO_FLAT_OPTS) as entry:
+        info = entry.ydl.extract_info(url, download=False)
+    
+    # Check if it's a playlist
+    is_playlist = info.get('_type') == 'playlist' or 'entries' in info
+    
+    if is_playlist:
+        entries = list(info.get('entries', []))
+        register_thumbnails(*(e.get('thumbnail', '') for e in entries[:50] if e))
         return {
-            'is_playlist': False,
-            'title': info.get('title', 'Unknown'),
-            'thumbnail': info.get('thumbnail', ''),
-            'duration': info.get('duration', 0),
+            'is_playlist': True,
+            'playlist_title': info.get('title', 'Playlist'),
+            'playlist_id': info.get('id', ''),
+            'playlist_count': len(entries),
             'uploader': info.get('uploader', 'Unknown'),
-            'view_count': info.get('view_count', 0),
-            'description': info.get('description', '')[:500] if info.get('description') else '',
-            'formats': formats,
-            'webpage_url': info.get('webpage_url', url),
-            'subtitles': subtitles,
-            'has_subtitles': len(subtitles) > 0,
+            'thumbnail': info.get('thumbnail', '') or (entries[0].get('thumbnail', '') if entries else ''),
+            'entries': [{
+                'id': e.get('id', ''),
+                'title': e.get('title', 'Unknown'),
+                'url': e.get('url', '') or e.get('webpage_url', ''),
+                'thumbnail': e.get('thumbnail', ''),
+                'thumbnail_url': thumbnail_url(e.get('thumbnail', ''), 'small'),
+                'duration': e.get('duration', 0),
+                'uploader': e.get('uploader', info.get('uploader', 'Unknown')),
+            } for e in entries[:50] if e]  # Limit to first 50 videos
         }
+    
+    # Single video - get full details
+    with ydl_pool.lease('info', INFO_FULL_OPTS) as entry:
+        info = entry.ydl.extract_info(url, download=False)
+    
+    # Get available formats
+    formats = []
+    if format_mode == 'full' and 'formats' in info:
+        for f in info['formats']:
+            format_info = {
+                'format_id': f.get('format_id', ''),
+                'ext': f.get('ext', ''),
+                'resolution': f.get('resolution', 'audio only'),
+                'filesize': f.get('filesize', 0),
+                'vcodec': f.get('vcodec', 'none'),
+                'acodec': f.get('acodec', 'none'),
+                'format_note': f.get('format_note', ''),
+                'fps': f.get('fps', 0),
+                'tbr': f.get('tbr', 0),
+            }
+            formats.append(format_info)
+    
+    # Get available subtitles
+    subtitles = {}
+    if 'subtitles' in info:
+        for lang, subs in info['subtitles'].items():
+            subtitles[lang] = {
+                'name': get_language_name(lang),
+                'formats': [s.get('ext', 'vtt') for s in subs]
+            }
+    if 'automatic_captions' in info:
+        for lang, subs in info['automatic_captions'].items():
+            if lang not in subtitles:
+                subtitles[lang] = {
+                    'name': get_language_name(lang) + ' (auto)',
+                    'formats': [s.get('ext', 'vtt') for s in subs],
+                    'auto': True
+                }
+    
+    register_thumbnails(info.get('thumbnail', ''))
+    result = {
+        'is_playlist': False,
+        'title': info.get('title', 'Unknown'),
+        'thumbnail': info.get('thumbnail', ''),
+        'thumbnail_url': thumbnail_url(info.get('thumbnail', ''), 'large'),
+        'duration': info.get('duration', 0),
+        'uploader': info.get('uploader', 'Unknown'),
+        'view_count': info.get('view_count', 0),
+        'description': info.get('description', '')[:500] if info.get('description') else '',
+        'webpage_url': info.get('webpage_url', url),
+        'subtitles': subtitles,
+        'has_subtitles': len(subtitles) > 0,
+    }
+    if format_mode == 'full':
+        result['formats'] = formats
+    elif format_mode == 'ladder':
+        result['format_ladder'] = summarize_formats(info.get('formats') or [])
+    return result
 
 
 def get_language_name(code):
@@ -421,111 +1871,935 @@ def postprocessor_hook(d, download_id):
             download.eta = 'Finalizing...'
 
 
-def download_video(url, download_id, format_type='best', quality='best', audio_only=False, 
-                   audio_format='mp3', download_subs=False, sub_lang='en', embed_subs=False):
-    """Download video in a separate thread"""
-    try:
-        with download_lock:
-            if download_id not in downloads:
-                return
-            downloads[download_id].status = 'starting'
-        
-        # Configure output template
-        output_template = os.path.join(DOWNLOAD_FOLDER, '%(title)s.%(ext)s')
-        
-        # Determine if we'll have multiple streams
-        will_merge = False
-        
-        # Base options with resume support
-        ydl_opts = {
-            'outtmpl': output_template,
-            'progress_hooks': [lambda d: progress_hook(d, download_id)],
-            'postprocessor_hooks': [lambda d: postprocessor_hook(d, download_id)],
-            'quiet': True,
-            'no_warnings': True,
-            'ignoreerrors': False,
-            'noplaylist': True,
-            # Resume/continue partial downloads
-            'continuedl': True,
-            # Keep partial files for resume
-            'noprogress': False,
-            # Retry on failure
-            'retries': 10,
-            'fragment_retries': 10,
-            # Keep video file if post-processing fails
-            'keepvideo': False,
-            # Socket timeout
-            'socket_timeout': 30,
-            # File access retries
-            'file_access_retries': 5,
-            # Embed thumbnail in audio files
-            'writethumbnail': audio_only,
-            # Rate limiting protection - add sleep between requests
-            'sleep_interval_requests': 1,
-            # Don't fail on subtitle errors
-            'ignoreerrors': 'only_download',
-        }
-        
-        # Subtitle options - wrapped in try/catch style with ignore errors
-        if download_subs and not audio_only:
-            ydl_opts['writesubtitles'] = True
-            ydl_opts['writeautomaticsub'] = True
-            ydl_opts['subtitleslangs'] = [sub_lang, 'en']  # Requested + English fallback
-            ydl_opts['subtitlesformat'] = 'srt/vtt/best'
-            # Skip unavailable subtitles instead of failing
-            ydl_opts['skip_unavailable_fragments'] = True
-            # Add sleep to avoid rate limiting on subtitle requests
-            ydl_opts['sleep_interval_subtitles'] = 2
-            
-            if embed_subs:
-                # Embed subtitles into video
-                if 'postprocessors' not in ydl_opts:
-                    ydl_opts['postprocessors'] = []
-                ydl_opts['postprocessors'].append({
-                    'key': 'FFmpegEmbedSubtitle',
-                    # Don't fail if subtitles unavailable
-                    'already_have_subtitle': False,
-                })
-        
-        if audio_only:
-            # Audio-only download - single stream
-            ydl_opts['format'] = 'bestaudio/best'
-            ydl_opts['postprocessors'] = [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': audio_format,
-                'preferredquality': '192' if quality == 'best' else quality,
-            }]
-            # Embed thumbnail for audio
+def file_finished_hook(path, download_id):
+    """Record where a download's final file ended up after post-processing"""
+    with download_lock:
+        if download_id in downloads:
+            downloads[download_id].filepath = path
+            downloads[download_id].filename = os.path.basename(path)
+
+
+def build_download_opts(quality='best', audio_only=False, audio_format='mp3',
+                        download_subs=False, sub_lang='en', embed_subs=False, rate_limit=0):
+    """Build YoutubeDL options for a download job, returns (ydl_opts, will_merge)
+    
+    Progress and post-processor hooks are added by the caller, since they
+    depend on which download the YoutubeDL instance is working on.
+    """
+    # Configure output template
+    output_template = library_outtmpl()
+    
+    # Determine if we'll have multiple streams
+    will_merge = False
+    
+    # Base options with resume support
+    ydl_opts = {
+        'outtmpl': output_template,
+        'quiet': True,
+        'no_warnings': True,
+        'ignoreerrors': False,
+        'noplaylist': True,
+        # Resume/continue partial downloads
+        'continuedl': True,
+        # Keep partial files for resume
+        'noprogress': False,
+        # Retry on failure
+        'retries': 10,
+        'fragment_retries': 10,
+        # Keep video file if post-processing fails
+        'keepvideo': False,
+        # Socket timeout
+        'socket_timeout': 30,
+        # File access retries
+        'file_access_retries': 5,
+        # Embed thumbnail in audio files
+        'writethumbnail': audio_only,
+        # Rate limiting protection is handled per host by host_pacer
+        # Subtitle failures are handled by run_download_step
+    }
+    
+    # Bandwidth share of the schedule window the job runs in
+    if rate_limit:
+        ydl_opts['ratelimit'] = rate_limit
+    
+    # Subtitle options - if only the subtitles fail, run_download_step retries without them
+    if download_subs and not audio_only:
+        ydl_opts['writesubtitles'] = True
+        ydl_opts['writeautomaticsub'] = True
+        ydl_opts['subtitleslangs'] = [sub_lang, 'en']  # Requested + English fallback
+        ydl_opts['subtitlesformat'] = 'srt/vtt/best'
+        # Skip unavailable subtitles instead of failing
+        ydl_opts['skip_unavailable_fragments'] = True
+        if embed_subs:
+            # Embed subtitles into video
+            if 'postprocessors' not in ydl_opts:
+                ydl_opts['postprocessors'] = []
             ydl_opts['postprocessors'].append({
-                'key': 'EmbedThumbnail',
-            })
-            ydl_opts['postprocessors'].append({
-                'key': 'FFmpegMetadata',
+                'key': 'FFmpegEmbedSubtitle',
+                # Don't fail if subtitles unavailable
+                'already_have_subtitle': False,
             })
+    
+    if audio_only:
+        # Audio-only download - single stream
+        ydl_opts['format'] = 'bestaudio/best'
+        ydl_opts['postprocessors'] = [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': audio_format,
+            'preferredquality': '192' if quality == 'best' else quality,
+        }]
+        # Embed thumbnail for audio
+        ydl_opts['postprocessors'].append({
+            'key': 'EmbedThumbnail',
+        })
+        ydl_opts['postprocessors'].append({
+            'key': 'FFmpegMetadata',
+        })
+    else:
+        # Video download with quality selection - may need merging
+        will_merge = True  # Assume video+audio merge for quality downloads
+        
+        if quality == 'best':
+            ydl_opts['format'] = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best[ext=mp4]/best'
+        elif quality == '2160':
+            ydl_opts['format'] = 'bestvideo[height<=2160][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=2160]+bestaudio/best[height<=2160][ext=mp4]/best'
+        elif quality == '1440':
+            ydl_opts['format'] = 'bestvideo[height<=1440][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=1440]+bestaudio/best[height<=1440][ext=mp4]/best'
+        elif quality == '1080':
+            ydl_opts['format'] = 'bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=1080]+bestaudio/best[height<=1080][ext=mp4]/best'
+        elif quality == '720':
+            ydl_opts['format'] = 'bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=720]+bestaudio/best[height<=720][ext=mp4]/best'
+        elif quality == '480':
+            ydl_opts['format'] = 'bestvideo[height<=480][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=480]+bestaudio/best[height<=480][ext=mp4]/best'
+        elif quality == '360':
+            ydl_opts['format'] = 'bestvideo[height<=360][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=360]+bestaudio/best[height<=360][ext=mp4]/best'
         else:
-            # Video download with quality selection - may need merging
-            will_merge = True  # Assume video+audio merge for quality downloads
+            ydl_opts['format'] = 'best[ext=mp4]/best'
+            will_merge = False
+        
+        # Merge to mp4
+        ydl_opts['merge_output_format'] = 'mp4'
+    
+    return ydl_opts, will_merge
+
+
+class InsufficientStorageError(Exception):
+    """Raised when a job can't be admitted because the disk or quota can't hold it"""
+
+
+class StorageManager:
+    """Pre-flight space reservations, library quota and LRU eviction
+    
+    Before a job transfers anything, its estimated size (streams plus merge
+    headroom) is reserved against both the free disk space and the library
+    quota. When there isn't room, the least recently served library files
+    are evicted first; if that still isn't enough the job is refused.
+    
+    Bytes a job has already written no longer show up as free disk space,
+    so against the disk only the rest of its reservation is counted. The
+    quota counts the whole reservation, as in-flight files aren't in the
+    library yet.
+    """
+    def __init__(self):
+        self.reserved = {}  # download_id -> bytes
+        self.written = {}  # download_id -> {stream filename: bytes on disk}
+        self.lock = threading.Lock()
+        # Progress hooks update written bytes without waiting on an eviction in progress
+        self.written_lock = threading.Lock()
+    
+    def library_files(self):
+        """Completed files in the library as (name, path, size, mtime)"""
+        conn = sqlite3.connect(DATABASE_PATH)
+        cursor = conn.cursor()
+        cursor.execute('SELECT key, path, size, mtime FROM library_files')
+        rows = cursor.fetchall()
+        conn.close()
+        return [(key, os.path.join(DOWNLOAD_FOLDER, path), size or 0, mtime or 0) for key, path, size, mtime in rows]
+    
+    def record_written(self, download_id, filename, written):
+        """Note how much of a stream a job has on disk"""
+        with self.written_lock:
+            if download_id in self.reserved:
+                self.written.setdefault(download_id, {})[filename] = written
+    
+    def outstanding(self):
+        """Reserved bytes that haven't been written yet"""
+        with self.written_lock:
+            return sum(max(0, size - sum(self.written.get(download_id, {}).values()))
+                       for download_id, size in self.reserved.items())
+    
+    def room(self, files):
+        """Bytes that can still be written, limited by free disk space and the quota"""
+        reserved = sum(self.reserved.values())
+        room = shutil.disk_usage(DOWNLOAD_FOLDER).free - STORAGE_MIN_FREE_BYTES - self.outstanding()
+        if STORAGE_QUOTA_BYTES:
+            room = min(room, STORAGE_QUOTA_BYTES - sum(f[2] for f in files) - reserved)
+        return room
+    
+    def reserve(self, download_id, size, protected_prefixes=()):
+        """Reserve space for a job, evicting old files if needed"""
+        with self.lock:
+            self._drop(download_id)
+            files = self.library_files()
+            shortfall = size - self.room(files)
+            if shortfall > 0 and STORAGE_EVICT_LRU:
+                self.evict(files, shortfall, protected_prefixes)
+                shortfall = size - self.room(self.library_files())
+            if shortfall > 0:
+                raise InsufficientStorageError(
+                    f'Not enough storage: need {size / (1024 * 1024):.0f} MiB, '
+                    f'short by {shortfall / (1024 * 1024):.0f} MiB'
+                )
+            with self.written_lock:
+                self.reserved[download_id] = size
+    
+    def _drop(self, download_id):
+        with self.written_lock:
+            self.reserved.pop(download_id, None)
+            self.written.pop(download_id, None)
+    
+    def release(self, download_id):
+        """Drop a job's reservation once its file is on disk or it failed"""
+        with self.lock:
+            self._drop(download_id)
+    
+    def evict(self, files, needed, protected_prefixes):
+        """Delete least recently served files until needed bytes are freed"""
+        last_served = get_file_access_times()
+        # Files never served count from when they were written
+        candidates = sorted(
+            (f for f in files if not any(f[0].startswith(p) for p in protected_prefixes)),
+            key=lambda f: max(last_served.get(f[0], 0), f[3])
+        )
+        freed = 0
+        for name, path, size, _ in candidates:
+            if freed >= needed:
+                break
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Error evicting {name}: {e}")
+                continue
+            prune_empty_dirs(path)
+            freed += size
+            forget_library_file(name, evicted=True)
+            print(f"Evicted {name} ({size} bytes) to make room")
+    
+    def usage(self):
+        """Current storage figures for the API"""
+        with self.lock:
+            files = self.library_files()
+            disk = shutil.disk_usage(DOWNLOAD_FOLDER)
+            return {
+                'library_bytes': sum(f[2] for f in files),
+                'library_files': len(files),
+                'quota_bytes': STORAGE_QUOTA_BYTES,
+                'reserved_bytes': sum(self.reserved.values()),
+                'outstanding_bytes': self.outstanding(),
+                'disk_free_bytes': disk.free,
+                'disk_total_bytes': disk.total,
+                'available_bytes': max(0, self.room(files)),
+            }
+
+
+storage_manager = StorageManager()
+
+
+def is_partial_file(name):
+    """Whether a file in the download folder is an unfinished download"""
+    return name.endswith('.part') or name.endswith('.ytdl') or '.part-Frag' in name
+
+
+def estimate_download_size(info, audio_only=False):
+    """Bytes a job will need on disk, including room to merge or convert"""
+    formats = info.get('requested_formats') or [info]
+    total = 0
+    for f in formats:
+        size = get_format_filesize(f)
+        if not size and f.get('tbr') and info.get('duration'):
+            # Estimate from bitrate (kbit/s) when the site doesn't report a size
+            size = f['tbr'] * 1000 / 8 * info['duration']
+        total += size
+    # Merging and audio conversion write the output while the inputs still exist
+    if len(formats) > 1 or audio_only:
+        total *= 1 + STORAGE_MERGE_HEADROOM
+    return int(total)
+
+
+def reserve_storage(download_id, info, audio_only=False):
+    """Reserve disk space for a job before any bytes are transferred"""
+    size = estimate_download_size(info, audio_only)
+    # Never evict files that belong to jobs still in progress
+    with download_lock:
+        protected = [partial_file_prefix(dl.filename) for dl in downloads.values()
+                     if dl.filename and dl.status not in ['completed', 'error']]
+    storage_manager.reserve(download_id, size, protected)
+
+
+def record_file_access(filename):
+    """Remember when a library file was last served (drives LRU eviction)"""
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute('''
+            INSERT INTO file_access (filename, last_served, serve_count) VALUES (?, ?, 1)
+            ON CONFLICT(filename) DO UPDATE SET last_served = excluded.last_served, serve_count = serve_count + 1
+        ''', (filename, time.time()))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Error recording file access: {e}")
+
+
+def get_file_access_times():
+    """Last served time of every library file that has been served"""
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        cursor = conn.cursor()
+        cursor.execute('SELECT filename, last_served FROM file_access')
+        rows = cursor.fetchall()
+        conn.close()
+        return dict(rows)
+    except Exception as e:
+        print(f"Error reading file access stats: {e}")
+        return {}
+
+
+def forget_library_file(filename, evicted=False):
+    """Drop the index entry and access stats of a removed file, marking its history rows if evicted"""
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.row_factory = sqlite3.Row
+        with conn:
+            conn.execute('DELETE FROM file_access WHERE filename = ?', (filename,))
+            conn.execute('DELETE FROM library_files WHERE key = ?', (filename,))
+            cursor = conn.execute(f'''
+                SELECT id, {STATS_COLUMNS} FROM download_history WHERE filename = ? AND status = 'completed'
+            ''', (filename,))
+            rows = cursor.fetchall()
+            apply_history_stats(conn, rows, -1)
+            status = 'evicted' if evicted else 'completed'
+            conn.executemany('UPDATE download_history SET stored = 0, status = ? WHERE id = ?',
+                             [(status, row['id']) for row in rows])
+            apply_history_stats(conn, [{**dict(row), 'stored': 0, 'status': status} for row in rows], 1)
+        conn.close()
+    except Exception as e:
+        print(f"Error updating file stats: {e}")
+
+
+# ZIP export: archives are generated on the fly in stored mode (media is
+# already compressed), so the offset of every byte is known before the first
+# one is sent. That gives an exact Content-Length and lets clients resume with
+# a Range request, without ever writing the archive to disk.
+ZIP_LIMIT = 0xFFFFFFFF  # Sizes/offsets at or above this need ZIP64 fields
+ZIP_FLAGS = 0x0808  # CRC and sizes follow the data in a descriptor, UTF-8 names
+ZIP_MADE_BY = (3 << 8) | 45  # Unix, spec version 4.5
+ZIP_FILE_ATTRS = 0o100644 << 16
+
+export_crc_cache = collections.OrderedDict()  # (path, size, mtime_ns) -> crc32
+export_crc_lock = threading.Lock()
+
+
+def dos_datetime(timestamp):
+    """MS-DOS time and date words for a timestamp"""
+    t = time.localtime(timestamp)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1  # 1980-01-01, the earliest date the format has
+    year = min(t.tm_year, 2107) - 1980
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), (year << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class ZipExport:
+    """A stored-mode ZIP archive of library files, streamed straight from disk
+    
+    The layout is computed from file sizes alone. CRCs are worked out while
+    the data streams past and go into the data descriptor after each file, so
+    memory use doesn't depend on the size or number of files.
+    """
+    def __init__(self, files):
+        self.entries = []
+        self.segments = []  # (length, kind, entry index)
+        offset = 0
+        for arcname, path in files:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # Deleted since the export was created
+            entry = {
+                'name': arcname.encode('utf-8'),
+                'path': path,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'dostime': dos_datetime(stat.st_mtime),
+                'zip64': stat.st_size >= ZIP_LIMIT,
+                'offset': offset,
+            }
+            index = len(self.entries)
+            self.entries.append(entry)
+            for length, kind in ((30 + len(entry['name']) + (20 if entry['zip64'] else 0), 'local'),
+                                 (entry['size'], 'data'),
+                                 (24 if entry['zip64'] else 16, 'descriptor')):
+                self.segments.append((length, kind, index))
+                offset += length
+        
+        self.central_offset = offset
+        for index, entry in enumerate(self.entries):
+            length = 46 + len(entry['name']) + len(self.central_extra(entry))
+            self.segments.append((length, 'central', index))
+            offset += length
+        self.central_size = offset - self.central_offset
+        
+        self.zip64_end = (len(self.entries) >= 0xFFFF or self.central_offset >= ZIP_LIMIT
+                          or self.central_size >= ZIP_LIMIT)
+        self.segments.append((22 + (76 if self.zip64_end else 0), 'end', None))
+        self.size = offset + self.segments[-1][0]
+        
+        # Changes whenever any file (and therefore any byte of the archive) does
+        signature = hashlib.sha1()
+        for entry in self.entries:
+            signature.update(b'%s\0%d\0%d\0' % (entry['name'], entry['size'], entry['mtime_ns']))
+        self.etag = signature.hexdigest()
+    
+    def central_extra(self, entry):
+        """ZIP64 extra field for an entry's central directory record"""
+        values = []
+        if entry['zip64']:
+            values += [entry['size'], entry['size']]
+        if entry['offset'] >= ZIP_LIMIT:
+            values.append(entry['offset'])
+        if not values:
+            return b''
+        return struct.pack(f'<HH{len(values)}Q', 1, 8 * len(values), *values)
+    
+    def crc_key(self, entry):
+        return entry['path'], entry['size'], entry['mtime_ns']
+    
+    def remember_crc(self, entry, crc):
+        with export_crc_lock:
+            export_crc_cache[self.crc_key(entry)] = crc
+            export_crc_cache.move_to_end(self.crc_key(entry))
+            while len(export_crc_cache) > EXPORT_CRC_CACHE_SIZE:
+                export_crc_cache.popitem(last=False)
+    
+    def get_crc(self, entry):
+        """CRC of an entry, reading the file only if it hasn't streamed before"""
+        with export_crc_lock:
+            crc = export_crc_cache.get(self.crc_key(entry))
+        if crc is None:
+            crc = 0
+            for chunk in self.read_file(entry, 0, entry['size']):
+                crc = zlib.crc32(chunk, crc)
+            self.remember_crc(entry, crc)
+        return crc
+    
+    def read_file(self, entry, start, stop):
+        """Yield bytes [start, stop) of an entry's file"""
+        with open(entry['path'], 'rb') as f:
+            if os.fstat(f.fileno()).st_size != entry['size']:
+                raise IOError(f"{entry['path']} changed during export")
+            f.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError(f"{entry['path']} changed during export")
+                remaining -= len(chunk)
+                yield chunk
+    
+    def segment_bytes(self, kind, entry):
+        """Header, descriptor or directory bytes for a segment"""
+        if kind == 'local':
+            dostime, dosdate = entry['dostime']
+            if entry['zip64']:
+                version, sizes, extra = 45, ZIP_LIMIT, struct.pack('<HHQQ', 1, 16, 0, 0)
+            else:
+                version, sizes, extra = 20, 0, b''
+            return struct.pack('<IHHHHHIIIHH', 0x04034b50, version, ZIP_FLAGS, 0, dostime, dosdate,
+                               0, sizes, sizes, len(entry['name']), len(extra)) + entry['name'] + extra
+        
+        if kind == 'descriptor':
+            size_format = 'Q' if entry['zip64'] else 'I'
+            return struct.pack(f'<II{size_format}{size_format}', 0x08074b50, self.get_crc(entry),
+                               entry['size'], entry['size'])
+        
+        if kind == 'central':
+            dostime, dosdate = entry['dostime']
+            extra = self.central_extra(entry)
+            size = ZIP_LIMIT if entry['zip64'] else entry['size']
+            return struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, ZIP_MADE_BY, 45 if extra else 20,
+                               ZIP_FLAGS, 0, dostime, dosdate, self.get_crc(entry), size, size,
+                               len(entry['name']), len(extra), 0, 0, 0, ZIP_FILE_ATTRS,
+                               min(entry['offset'], ZIP_LIMIT)) + entry['name'] + extra
+        
+        # End of central directory, preceded by its ZIP64 variant when anything overflows
+        count = len(self.entries)
+        data = b''
+        if self.zip64_end:
+            zip64_end_offset = self.central_offset + self.central_size
+            data += struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, ZIP_MADE_BY, 45, 0, 0,
+                                count, count, self.central_size, self.central_offset)
+            data += struct.pack('<IIQI', 0x07064b50, 0, zip64_end_offset, 1)
+        return data + struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                                  min(self.central_size, ZIP_LIMIT), min(self.central_offset, ZIP_LIMIT), 0)
+    
+    def iter_bytes(self, start=0, stop=None):
+        """Yield archive bytes [start, stop)"""
+        stop = self.size if stop is None else stop
+        position = 0
+        for length, kind, index in self.segments:
+            segment_start, position = position, position + length
+            if position <= start or length == 0:
+                continue
+            if segment_start >= stop:
+                return
+            entry = self.entries[index] if index is not None else None
+            low = max(start, segment_start) - segment_start
+            high = min(stop, position) - segment_start
+            
+            if kind != 'data':
+                yield self.segment_bytes(kind, entry)[low:high]
+            elif low == 0 and high == length:
+                # The whole file goes out, so checksum it on the way
+                crc = 0
+                for chunk in self.read_file(entry, 0, length):
+                    crc = zlib.crc32(chunk, crc)
+                    yield chunk
+                self.remember_crc(entry, crc)
+            else:
+                yield from self.read_file(entry, low, high)
+
+
+def create_export(name, filenames):
+    """Record an export of library files and return its id"""
+    export_id = str(uuid.uuid4())
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.execute('DELETE FROM library_exports WHERE created_at < ?', (time.time() - EXPORT_TTL,))
+    conn.execute('INSERT INTO library_exports (id, name, files, created_at) VALUES (?, ?, ?, ?)',
+                 (export_id, name, json.dumps(filenames), time.time()))
+    conn.commit()
+    conn.close()
+    return export_id
+
+
+def load_export(export_id):
+    """Name and file list of a recorded export, or None if unknown or expired"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute('SELECT name, files FROM library_exports WHERE id = ? AND created_at >= ?',
+                   (export_id, time.time() - EXPORT_TTL))
+    row = cursor.fetchone()
+    conn.close()
+    if row is None:
+        return None
+    return row[0], json.loads(row[1])
+
+
+def get_playlist_files(playlist_title):
+    """Library files downloaded as part of a playlist, oldest first"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT DISTINCT filename FROM download_history
+        WHERE playlist_title = ? AND status = 'completed' AND filename IS NOT NULL
+        ORDER BY created_at
+    ''', (playlist_title,))
+    rows = cursor.fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+
+def get_library_keys():
+    """Keys of every file in the library index, newest first"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    cursor.execute('SELECT key FROM library_files ORDER BY mtime DESC')
+    rows = cursor.fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+
+def export_entries(filenames):
+    """(arcname, path) of library files, named by title with duplicates numbered"""
+    entries = []
+    taken = set()
+    for filename in filenames:
+        entry = get_library_file(filename)
+        if entry is None:
+            continue
+        arcname = library_download_name(entry)
+        stem, ext = os.path.splitext(arcname)
+        n = 1
+        while arcname.lower() in taken:
+            n += 1
+            arcname = f'{stem} ({n}){ext}'
+        taken.add(arcname.lower())
+        entries.append((arcname, entry['abspath']))
+    return entries
+
+
+def parse_range(header, size):
+    """(start, stop) of a single "bytes=" range, None for no range, False if unsatisfiable"""
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', (header or '').strip())
+    if not match or not any(match.groups()):
+        return None  # Absent, malformed or multi-range: send everything
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        stop = min(int(last) + 1, size) if last else size
+    else:
+        start, stop = max(size - int(last), 0), size
+    if start >= size or stop <= start:
+        return False
+    return start, stop
+
+
+def apply_video_info(download_id, info):
+    """Copy extracted metadata onto a download's progress tracker"""
+    register_thumbnails(info.get('thumbnail', ''))
+    with download_lock:
+        if download_id in downloads:
+            dl = downloads[download_id]
+            dl.title = info.get('title', 'Unknown')
+            dl.thumbnail = info.get('thumbnail', '')
+            dl.uploader = info.get('uploader', 'Unknown')
+            dl.duration = info.get('duration', 0)
+            dl.extractor = info.get('extractor_key') or ''
+            dl.video_id = info.get('id') or ''
+            dl.uploader_id = info.get('uploader_id') or info.get('channel_id') or ''
+            dl.upload_date = info.get('upload_date') or ''
             
-            if quality == 'best':
-                ydl_opts['format'] = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/bestvideo+bestaudio/best[ext=mp4]/best'
-            elif quality == '2160':
-                ydl_opts['format'] = 'bestvideo[height<=2160][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=2160]+bestaudio/best[height<=2160][ext=mp4]/best'
-            elif quality == '1440':
-                ydl_opts['format'] = 'bestvideo[height<=1440][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=1440]+bestaudio/best[height<=1440][ext=mp4]/best'
-            elif quality == '1080':
-                ydl_opts['format'] = 'bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=1080]+bestaudio/best[height<=1080][ext=mp4]/best'
-            elif quality == '720':
-                ydl_opts['format'] = 'bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=720]+bestaudio/best[height<=720][ext=mp4]/best'
-            elif quality == '480':
-                ydl_opts['format'] = 'bestvideo[height<=480][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=480]+bestaudio/best[height<=480][ext=mp4]/best'
-            elif quality == '360':
-                ydl_opts['format'] = 'bestvideo[height<=360][ext=mp4]+bestaudio[ext=m4a]/bestvideo[height<=360]+bestaudio/best[height<=360][ext=mp4]/best'
+            # Check actual format selection - see if it requires merging
+            requested_formats = info.get('requested_formats', [])
+            if len(requested_formats) >= 2:
+                dl.total_streams = 2
             else:
-                ydl_opts['format'] = 'best[ext=mp4]/best'
-                will_merge = False
+                dl.total_streams = 1
+
+
+def run_download_step(download_id, ydl, step):
+    """Run a YoutubeDL download call, downloading without subtitles if only they fail
+    
+    Any other failure (including a 429 on the media) propagates to the error
+    classifier.
+    """
+    try:
+        step()
+    except yt_dlp.utils.DownloadError as e:
+        if not any(pattern in str(e).lower() for pattern in SUBTITLE_ERROR_PATTERNS):
+            raise
+        reason = ' (rate limited)' if classify_error(e) == 'rate_limited' else ''
+        with download_lock:
+            if download_id in downloads:
+                downloads[download_id].warning = f'Subtitles unavailable{reason}, downloaded without them'
+        
+        # The pooled session is shared with later jobs, so its options are put back
+        saved = {key: ydl.params.get(key) for key in ('writesubtitles', 'writeautomaticsub')}
+        ydl.params.update(writesubtitles=False, writeautomaticsub=False)
+        try:
+            step()
+        finally:
+            ydl.params.update(saved)
+
+
+def complete_download(download_id, url, quality, audio_only, audio_format):
+    """Mark a download as completed and save it to history"""
+    storage_manager.release(download_id)
+    with download_lock:
+        if download_id in downloads:
+            dl = downloads[download_id]
+            release_queue_slot(dl)
+            dl.status = 'completed'
+            dl.progress = 100
+            dl.is_merging = False
+            dl.speed = ''
+            dl.eta = ''
+            
+            # Get filesize and add the file to the library index
+            filesize = 0
+            filepath = dl.filepath or (os.path.join(DOWNLOAD_FOLDER, dl.filename) if dl.filename else '')
+            if filepath and os.path.isfile(filepath):
+                filesize = os.path.getsize(filepath)
+                dl.filename = os.path.basename(filepath)
+                index_library_file(filepath, title=dl.title, extractor=dl.extractor, video_id=dl.video_id,
+                                   uploader=dl.uploader, uploader_id=dl.uploader_id,
+                                   upload_date=dl.upload_date, download_id=download_id)
             
-            # Merge to mp4
-            ydl_opts['merge_output_format'] = 'mp4'
+            save_to_history(
+                download_id=download_id,
+                url=url,
+                title=dl.title,
+                thumbnail=dl.thumbnail,
+                uploader=dl.uploader,
+                duration=dl.duration,
+                quality=quality,
+                format_type='audio' if audio_only else 'video',
+                audio_format=audio_format if audio_only else None,
+                filename=dl.filename,
+                filesize=filesize,
+                status='completed',
+                playlist_title=dl.playlist_title
+            )
+            batch_id = dl.batch_id
+        else:
+            batch_id = ''
+    journal_remove(download_id)
+    if batch_id:
+        record_batch_result(batch_id, 'completed')
+
+
+def fail_download(download_id, url, quality, audio_only, audio_format, error):
+    """Mark a download as failed and save it to history"""
+    storage_manager.release(download_id)
+    with download_lock:
+        if download_id in downloads:
+            dl = downloads[download_id]
+            release_queue_slot(dl)
+            dl.status = 'error'
+            dl.error = str(error)
+            
+            save_to_history(
+                download_id=download_id,
+                url=url,
+                title=dl.title,
+                thumbnail=dl.thumbnail,
+                uploader=dl.uploader,
+                duration=dl.duration,
+                quality=quality,
+                format_type='audio' if audio_only else 'video',
+                audio_format=audio_format if audio_only else None,
+                filename=dl.filename,
+                filesize=0,
+                status='error',
+                error=str(error),
+                playlist_title=dl.playlist_title
+            )
+            batch_id = dl.batch_id
+        else:
+            batch_id = ''
+    journal_remove(download_id)
+    if batch_id:
+        record_batch_result(batch_id, 'error')
+
+
+def get_host(url):
+    """Host a URL points at, used to group jobs for circuit breaking and pacing"""
+    try:
+        host = (urllib.parse.urlsplit(url).hostname or '').lower()
+    except ValueError:
+        return ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def classify_error(error):
+    """Classify a download failure as 'rate_limited', 'transient' or 'permanent'"""
+    message = str(error).lower()
+    if any(pattern in message for pattern in RATE_LIMIT_ERROR_PATTERNS):
+        return 'rate_limited'
+    if any(pattern in message for pattern in EXPIRED_MEDIA_ERROR_PATTERNS):
+        return 'transient'
+    if any(pattern in message for pattern in PERMANENT_ERROR_PATTERNS):
+        return 'permanent'
+    if any(pattern in message for pattern in TRANSIENT_ERROR_PATTERNS):
+        return 'transient'
+    # Unknown errors are not retried automatically, the user can still retry by hand
+    return 'permanent'
+
+
+class CircuitBreaker:
+    """Failure state of one host
+    
+    closed: jobs run freely. open: the host failed repeatedly, no job runs
+    until the cooldown expires. half_open: jobs are let through with a
+    concurrency limit that doubles on every success until the breaker closes;
+    any failure opens it again with a longer cooldown.
+    """
+    def __init__(self):
+        self.state = 'closed'
+        self.failures = 0
+        self.cooldown = BREAKER_COOLDOWN
+        self.open_until = 0
+        self.limit = 1
+        self.successes = 0
+        self.in_flight = 0
+
+    def trip(self, now):
+        """Open the breaker, backing off further each time it trips in a row"""
+        if self.state == 'half_open':
+            self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+        self.state = 'open'
+        self.open_until = now + self.cooldown
+        self.failures = 0
+
+
+class HostBreakers:
+    """Registry of per-host circuit breakers shared by all jobs"""
+    def __init__(self):
+        self.breakers = {}
+        self.lock = threading.Lock()
+    
+    def acquire(self, host):
+        """Claim a slot for a job on a host, returns 0 or the seconds to wait first"""
+        if not host:
+            return 0
+        with self.lock:
+            breaker = self.breakers.setdefault(host, CircuitBreaker())
+            now = time.time()
+            if breaker.state == 'open':
+                if now < breaker.open_until:
+                    return breaker.open_until - now
+                breaker.state = 'half_open'
+                breaker.limit = 1
+                breaker.successes = 0
+            if breaker.state == 'half_open' and breaker.in_flight >= breaker.limit:
+                return BREAKER_PROBE_INTERVAL
+            breaker.in_flight += 1
+            return 0
+    
+    def release(self, host, error_kind=None):
+        """Report how a job on a host ended (error_kind None means success)"""
+        if not host:
+            return
+        with self.lock:
+            breaker = self.breakers.setdefault(host, CircuitBreaker())
+            breaker.in_flight = max(0, breaker.in_flight - 1)
+            now = time.time()
+            if error_kind is None:
+                breaker.failures = 0
+                if breaker.state == 'half_open':
+                    # Ramp back up gradually rather than releasing every waiting job at once
+                    breaker.successes += 1
+                    breaker.limit *= 2
+                    if breaker.successes >= BREAKER_CLOSE_AFTER:
+                        breaker.state = 'closed'
+                        breaker.cooldown = BREAKER_COOLDOWN
+            elif error_kind in ('transient', 'rate_limited'):
+                # Rate limiting is a clear signal from the host, so it counts double
+                breaker.failures += 2 if error_kind == 'rate_limited' else 1
+                if breaker.state == 'half_open' or breaker.failures >= BREAKER_FAILURE_THRESHOLD:
+                    breaker.trip(now)
+    
+    def retry_in(self, host):
+        """Seconds until an open breaker lets a probe through"""
+        with self.lock:
+            breaker = self.breakers.get(host)
+            if not breaker or breaker.state != 'open':
+                return 0
+            return max(0, breaker.open_until - time.time())
+    
+    def state(self, host):
+        """Breaker state of a host for status reporting"""
+        with self.lock:
+            breaker = self.breakers.get(host)
+            return breaker.state if breaker else 'closed'
+
+
+class RetryQueue:
+    """Restarts downloads once their backoff or breaker wait has expired"""
+    def __init__(self):
+        self.heap = []  # (due time, download_id)
+        self.condition = threading.Condition()
+        self.thread = None
+    
+    def schedule(self, download_id, delay):
+        """Resubmit a download after delay seconds"""
+        with self.condition:
+            heapq.heappush(self.heap, (time.time() + delay, download_id))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run)
+                self.thread.daemon = True
+                self.thread.start()
+            self.condition.notify()
+    
+    def _run(self):
+        """Wait for the earliest due job and resubmit it"""
+        while True:
+            with self.condition:
+                while not self.heap:
+                    self.condition.wait()
+                due, download_id = self.heap[0]
+                wait = due - time.time()
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                heapq.heappop(self.heap)
+            resubmit_download(download_id)
+
+
+host_breakers = HostBreakers()
+retry_queue = RetryQueue()
+
+
+def admit_to_host(download_id, host):
+    """Let a job start unless its host's breaker is open, otherwise park it"""
+    wait = host_breakers.acquire(host)
+    if not wait:
+        return True
+    with download_lock:
+        if download_id in downloads:
+            dl = downloads[download_id]
+            release_queue_slot(dl)
+            dl.status = 'waiting'
+            dl.next_retry_at = time.time() + wait
+    retry_queue.schedule(download_id, wait)
+    return False
+
+
+def schedule_retry(download_id, error_kind, error):
+    """Re-queue a failed download with jittered exponential backoff if it's worth retrying"""
+    with download_lock:
+        if download_id not in downloads:
+            return False
+        dl = downloads[download_id]
+        if error_kind == 'permanent' or dl.auto_retry_count >= RETRY_MAX_ATTEMPTS:
+            return False
+        
+        base = RETRY_RATE_LIMIT_BASE_DELAY if error_kind == 'rate_limited' else RETRY_BASE_DELAY
+        delay = min(RETRY_MAX_DELAY, base * 2 ** dl.auto_retry_count)
+        # Jitter so jobs that failed together don't all come back together
+        delay = random.uniform(delay / 2, delay)
+        # No point waking up before the host's breaker lets anything through
+        delay = max(delay, host_breakers.retry_in(dl.host))
+        
+        dl.reset_for_retry(manual=False)
+        release_queue_slot(dl)
+        dl.status = 'retrying'
+        dl.error_kind = error_kind
+        dl.last_error = str(error)
+        dl.next_retry_at = time.time() + delay
+    
+    retry_queue.schedule(download_id, delay)
+    return True
+
+
+def handle_download_error(download_id, url, quality, audio_only, audio_format, host, error):
+    """Report a failure to the host's breaker, then retry or fail the download"""
+    storage_manager.release(download_id)
+    error_kind = classify_error(error)
+    host_breakers.release(host, error_kind)
+    if not schedule_retry(download_id, error_kind, error):
+        with download_lock:
+            if download_id in downloads:
+                downloads[download_id].error_kind = error_kind
+        fail_download(download_id, url, quality, audio_only, audio_format, error)
+
+
+def download_video(url, download_id, format_type='best', quality='best', audio_only=False, 
+                   audio_format='mp3', download_subs=False, sub_lang='en', embed_subs=False):
+    """Download video in a separate thread"""
+    host = get_host(url)
+    if not admit_to_host(download_id, host):
+        return
+    
+    try:
+        with download_lock:
+            if download_id not in downloads:
+                host_breakers.release(host)
+                return
+            downloads[download_id].status = 'starting'
+            rate_limit = downloads[download_id].rate_limit
+        
+        ydl_opts, will_merge = build_download_opts(
+            quality, audio_only, audio_format, download_subs, sub_lang, embed_subs, rate_limit
+        )
         
         # Set up for multi-stream if needed
         with download_lock:
@@ -535,93 +2809,1029 @@ def download_video(url, download_id, format_type='best', quality='best', audio_o
                 else:
                     downloads[download_id].total_streams = 1
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with ydl_pool.lease('audio' if audio_only else 'video', ydl_opts, download_id) as entry:
+            ydl = entry.ydl
             # Get info first
             info = ydl.extract_info(url, download=False)
-            with download_lock:
-                if download_id in downloads:
-                    dl = downloads[download_id]
-                    dl.title = info.get('title', 'Unknown')
-                    dl.thumbnail = info.get('thumbnail', '')
-                    dl.uploader = info.get('uploader', 'Unknown')
-                    dl.duration = info.get('duration', 0)
-                    
-                    # Check actual format selection - see if it requires merging
-                    requested_formats = info.get('requested_formats', [])
-                    if len(requested_formats) >= 2:
-                        dl.total_streams = 2
-                    else:
-                        dl.total_streams = 1
+            apply_video_info(download_id, info)
+            reserve_storage(download_id, info, audio_only)
             
             # Download
+            run_download_step(download_id, ydl, lambda: ydl.download([url]))
+        
+        # Save to history
+        host_breakers.release(host)
+        complete_download(download_id, url, quality, audio_only, audio_format)
+            
+    except Exception as e:
+        handle_download_error(download_id, url, quality, audio_only, audio_format, host, e)
+
+
+class PlaylistExecutor:
+    """Download the entries of one playlist through long-lived YoutubeDL sessions
+    
+    Instead of one thread and one fresh YoutubeDL per entry, a small number of
+    workers each keep a single YoutubeDL (and with it one connection pool and
+    cookie jar) for the whole playlist and pull entries from a shared queue.
+    Hooks are routed to whichever entry a worker is currently downloading.
+    """
+    def __init__(self, jobs, quality='best', audio_only=False, audio_format='mp3',
+                 download_subs=False, sub_lang='en', embed_subs=False, concurrency=PLAYLIST_CONCURRENCY):
+        self.jobs = queue.Queue()
+        for job in jobs:
+            self.jobs.put(job)  # (download_id, url)
+        self.worker_count = max(1, min(concurrency, len(jobs)))
+        self.quality = quality
+        self.audio_only = audio_only
+        self.audio_format = audio_format
+        self.download_subs = download_subs
+        self.sub_lang = sub_lang
+        self.embed_subs = embed_subs
+    
+    def start(self):
+        """Start the worker threads"""
+        for _ in range(self.worker_count):
+            thread = threading.Thread(target=self._worker)
+            thread.daemon = True
+            thread.start()
+    
+    def _worker(self):
+        """Work through queued entries with one YoutubeDL session"""
+        ydl_opts, will_merge = build_download_opts(
+            self.quality, self.audio_only, self.audio_format,
+            self.download_subs, self.sub_lang, self.embed_subs
+        )
+        
+        try:
+            # One pooled session is held for the whole playlist
+            with ydl_pool.lease('audio' if self.audio_only else 'video', ydl_opts) as entry:
+                while True:
+                    try:
+                        download_id, url = self.jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    entry.download_id = download_id
+                    if not self._download_entry(entry.ydl, download_id, url, will_merge):
+                        entry.failed = True  # Don't return a session that saw errors to the pool
+        except Exception as e:
+            # The session itself failed - fail whatever is left so nothing hangs in 'pending'
+            while True:
+                try:
+                    download_id, url = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                fail_download(download_id, url, self.quality, self.audio_only, self.audio_format, e)
+    
+    def _download_entry(self, ydl, download_id, url, will_merge):
+        """Download a single playlist entry on an existing session, returns False on error"""
+        host = get_host(url)
+        if not admit_to_host(download_id, host):
+            return True  # Parked until the host recovers, it will be resubmitted on its own
+        
+        try:
+            with download_lock:
+                if download_id not in downloads:
+                    host_breakers.release(host)
+                    return True
+                downloads[download_id].status = 'starting'
+                downloads[download_id].current_stream = 0
+                downloads[download_id].total_streams = 2 if will_merge else 1
+            
+            info = ydl.extract_info(url, download=False)
+            apply_video_info(download_id, info)
+            reserve_storage(download_id, info, self.audio_only)
+            
+            # Reuse the extracted info rather than extracting the page a second time
+            run_download_step(download_id, ydl, lambda: ydl.process_ie_result(info, download=True))
+            
+            host_breakers.release(host)
+            complete_download(download_id, url, self.quality, self.audio_only, self.audio_format)
+            return True
+        except Exception as e:
+            handle_download_error(download_id, url, self.quality, self.audio_only, self.audio_format, host, e)
+            return False
+
+
+def submit_download(download_id):
+    """Journal a registered download and start it in the background"""
+    with download_lock:
+        if download_id not in downloads:
+            return
+        dl = downloads[download_id]
+        entry = dl.journal_entry()
+        args = (dl.url, download_id, 'best', dl.quality, dl.audio_only, dl.audio_format,
+                dl.download_subs, dl.sub_lang, dl.embed_subs)
+    
+    # Write-ahead: the job is on disk before any bytes are transferred
+    journal_jobs([entry])
+    
+    thread = threading.Thread(target=download_video, args=args)
+    thread.daemon = True
+    thread.start()
+
+
+def resubmit_download(download_id):
+    """Start a retried download again, bulk jobs go back through the queue"""
+    with download_lock:
+        dl = downloads.get(download_id)
+        if dl is None:
+            return
+        batch_id = dl.batch_id
+        if batch_id:
+            dl.status = 'queued'
+    if batch_id:
+        # Retries go to the front, they were dispatched once already
+        enqueue_downloads([download_id], front=True)
+    else:
+        submit_download(download_id)
+
+
+def enqueue_downloads(download_ids, front=False):
+    """Queue registered downloads to be started by the dispatcher as slots free up"""
+    global queue_processing
+    if not download_ids:
+        return
+    with queue_lock:
+        if front:
+            download_queue.extendleft(reversed(download_ids))
+        else:
+            download_queue.extend(download_ids)
+        if queue_processing:
+            return
+        queue_processing = True
+    thread = threading.Thread(target=process_download_queue)
+    thread.daemon = True
+    thread.start()
+
+
+def release_queue_slot(dl):
+    """Give back a dispatcher slot when a queued job stops running (download_lock held)"""
+    global queue_active
+    if dl.holds_queue_slot:
+        dl.holds_queue_slot = False
+        queue_active -= 1
+        queue_slot_freed.notify()
+
+
+def process_download_queue():
+    """Start queued downloads while fewer than QUEUE_CONCURRENCY of them are running"""
+    global queue_processing, queue_active
+    while True:
+        with queue_lock:
+            if not download_queue:
+                queue_processing = False
+                return
+        with download_lock:
+            # Slots are given back on status transitions, see release_queue_slot
+            while queue_active >= QUEUE_CONCURRENCY:
+                queue_slot_freed.wait()
+        with queue_lock:
+            download_id = download_queue.popleft()
+        with download_lock:
+            dl = downloads.get(download_id)
+            if dl is None or dl.holds_queue_slot:
+                continue
+            # Claims the slot right away so the next check includes it
+            dl.status = 'starting'
+            dl.holds_queue_slot = True
+            queue_active += 1
+        submit_download(download_id)
+
+
+def normalize_url(url):
+    """Canonical form of a URL for deduplication, or None if it isn't a web URL"""
+    url = url.strip()
+    try:
+        parts = urllib.parse.urlsplit(url)
+    except ValueError:
+        return None
+    if parts.scheme.lower() not in ('http', 'https') or not parts.hostname:
+        return None
+    host = parts.hostname.lower()
+    query = [(k, v) for k, v in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+             if not k.startswith('utm_') and k not in ('si', 'feature')]
+    
+    # Collapse the common YouTube spellings of one video into one URL
+    bare_host = host[4:] if host.startswith('www.') else host
+    if bare_host in ('youtube.com', 'm.youtube.com', 'music.youtube.com') and parts.path == '/watch':
+        video_id = dict(query).get('v')
+        if video_id:
+            return f'https://www.youtube.com/watch?v={video_id}'
+    if bare_host == 'youtu.be' and parts.path.strip('/'):
+        return f'https://www.youtube.com/watch?v={parts.path.strip("/")}'
+    
+    netloc = host if not parts.port else f'{host}:{parts.port}'
+    return urllib.parse.urlunsplit((parts.scheme.lower(), netloc, parts.path or '/',
+                                    urllib.parse.urlencode(query), ''))
+
+
+def read_bulk_urls(stream, ndjson):
+    """Yield URLs from a streamed text (one per line) or NDJSON upload"""
+    for raw in stream:
+        line = raw.decode('utf-8', errors='replace').strip()
+        if not line or line.startswith('#'):
+            continue
+        if ndjson:
+            try:
+                item = json.loads(line)
+            except ValueError:
+                yield None  # Counted as invalid
+                continue
+            yield item.get('url') if isinstance(item, dict) else item if isinstance(item, str) else None
+        else:
+            yield line
+
+
+def get_downloaded_urls(urls):
+    """Subset of urls already completed according to history"""
+    found = set()
+    urls = list(urls)
+    conn = sqlite3.connect(DATABASE_PATH)
+    cursor = conn.cursor()
+    # Chunked to stay under SQLite's bound parameter limit
+    for i in range(0, len(urls), 500):
+        chunk = urls[i:i + 500]
+        cursor.execute(f'''
+            SELECT url FROM download_history WHERE status = 'completed' AND url IN ({', '.join('?' * len(chunk))})
+        ''', chunk)
+        found.update(row[0] for row in cursor.fetchall())
+    conn.close()
+    return found
+
+
+def write_batch(conn, batch_id, options, total, entries):
+    """Insert a batch and all of its job specs on an open connection"""
+    conn.execute('''
+        INSERT INTO download_batches (id, options, total, completed, failed, created_at)
+        VALUES (?, ?, ?, 0, 0, ?)
+    ''', (batch_id, json.dumps(options), total, time.time()))
+    write_jobs(conn, entries)
+
+
+def journal_batch(batch_id, options, total, entries):
+    """Write a batch and all of its job specs in a single transaction"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    try:
+        with conn:
+            write_batch(conn, batch_id, options, total, entries)
+    finally:
+        conn.close()
+
+
+def record_batch_result(batch_id, status):
+    """Count a finished job of a batch towards its persisted totals"""
+    column = 'completed' if status == 'completed' else 'failed'
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute(f'UPDATE download_batches SET {column} = {column} + 1 WHERE id = ?', (batch_id,))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Error updating batch: {e}")
+
+
+def record_batch_retry(batch_id):
+    """Take a failed job that is being retried by hand back out of its batch's failures"""
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute('UPDATE download_batches SET failed = MAX(failed - 1, 0) WHERE id = ?', (batch_id,))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        print(f"Error updating batch: {e}")
+
+
+def get_batch_progress(batch_id):
+    """Aggregate counters of a bulk batch, or None if it doesn't exist"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM download_batches WHERE id = ?', (batch_id,))
+    row = cursor.fetchone()
+    conn.close()
+    if not row:
+        return None
+    
+    counts = {'queued': 0, 'active': 0, 'retrying': 0}
+    with download_lock:
+        for download_id in batch_jobs.get(batch_id, []):
+            dl = downloads.get(download_id)
+            if dl is None or dl.status in ['completed', 'error']:
+                continue  # Finished jobs are counted from the database
+            if dl.status == 'queued':
+                counts['queued'] += 1
+            elif dl.status in ['retrying', 'waiting']:
+                counts['retrying'] += 1
+            else:
+                counts['active'] += 1
+    
+    return {
+        'batch_id': batch_id,
+        'total': row['total'],
+        'completed': row['completed'],
+        'failed': row['failed'],
+        **counts,
+        'done': row['completed'] + row['failed'] >= row['total'],
+        'created_at': datetime.fromtimestamp(row['created_at']).isoformat(),
+    }
+
+
+# Subscriptions: channels/playlists polled in the background. Each feed keeps
+# the archive ids of the entries it has seen; yt-dlp treats that store as a
+# download archive and, with break_on_existing, stops listing the feed at the
+# first known entry, so a poll only pages through what is new.
+SUBSCRIPTION_FIELDS = ['url', 'title', 'options', 'interval', 'newest_first', 'backfill', 'enabled',
+                       'next_poll', 'last_polled', 'last_new', 'last_error', 'created_at']
+
+
+class SubscriptionArchive:
+    """Set-like download archive backed by a subscription's seen ids"""
+    def __init__(self, subscription_id):
+        self.subscription_id = subscription_id
+        self.conn = sqlite3.connect(DATABASE_PATH)
+    
+    def __contains__(self, archive_id):
+        cursor = self.conn.execute('''
+            SELECT 1 FROM subscription_seen WHERE subscription_id = ? AND archive_id = ?
+        ''', (self.subscription_id, archive_id))
+        return cursor.fetchone() is not None
+    
+    def __bool__(self):
+        return True  # yt-dlp skips the archive lookup for an empty archive
+    
+    def add(self, archive_id):
+        pass  # Entries are recorded together with their jobs once queued
+    
+    def close(self):
+        self.conn.close()
+
+
+def next_poll_time(interval):
+    """When to poll a feed next, jittered so feeds added together drift apart"""
+    return time.time() + interval * random.uniform(1 - SUBSCRIPTION_JITTER, 1 + SUBSCRIPTION_JITTER)
+
+
+def get_subscription(subscription_id):
+    """A subscription row as a dict, or None"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute('SELECT * FROM subscriptions WHERE id = ?', (subscription_id,))
+    row = cursor.fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def claim_due_subscription():
+    """Take the most overdue subscription and push its next poll forward
+    
+    Returns (subscription, None) or (None, seconds until the next one is due).
+    Claiming first means a crash mid-poll only delays the feed by one interval.
+    The read and the conditional update share a write transaction, so two
+    pollers never claim the same due feed.
+    """
+    now = time.time()
+    conn = sqlite3.connect(DATABASE_PATH, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = conn.execute('''
+                SELECT * FROM subscriptions WHERE enabled = 1 ORDER BY next_poll LIMIT 1
+            ''')
+            row = cursor.fetchone()
+            if row is None:
+                return None, None
+            if row['next_poll'] > now:
+                return None, row['next_poll'] - now
+            cursor = conn.execute('''
+                UPDATE subscriptions SET next_poll = ? WHERE id = ? AND enabled = 1 AND next_poll <= ?
+            ''', (next_poll_time(row['interval']), row['id'], now))
+            if cursor.rowcount != 1:
+                return None, 0  # Claimed elsewhere in the meantime, look again
+            conn.execute('COMMIT')
+            return dict(row), None
+        finally:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+    finally:
+        conn.close()
+
+
+def list_feed_entries(subscription):
+    """Entries of a feed that aren't in its archive, in feed order"""
+    found = []
+    
+    def collect(info, incomplete=False):
+        # Only called for entries the archive doesn't know
+        if info.get('live_status') == 'is_upcoming':
+            return 'Not released yet'  # Picked up by a later poll
+        found.append({key: info.get(key) for key in (
+            'id', 'ie_key', 'extractor_key', 'url', 'webpage_url', 'title', 'thumbnail', 'playlist_title')})
+        return None
+    
+    first_poll = not subscription['last_polled']
+    newest_first = bool(subscription['newest_first'])
+    archive = SubscriptionArchive(subscription['id'])
+    opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': 'in_playlist',
+        'lazy_playlist': True,  # Fetch pages only as far as the listing gets
+        'download_archive': archive,
+        'break_on_existing': newest_first,
+        'match_filter': collect,
+    }
+    if first_poll and newest_first:
+        opts['playlistend'] = SUBSCRIPTION_FIRST_POLL_ITEMS
+    # Later polls have no item cap: entries past a cap would never be listed
+    # again, since the next poll stops at the first known entry before them
+    
+    try:
+        with PacedYoutubeDL(opts) as ydl:
+            ydl.extract_info(subscription['url'], download=False)
+    except yt_dlp.utils.ExistingVideoReached:
+        pass  # Reached the part of the feed seen by an earlier poll
+    finally:
+        archive.close()
+    return found
+
+
+def poll_subscription(subscription):
+    """Poll one feed and queue its new entries as a batch"""
+    subscription_id = subscription['id']
+    now = time.time()
+    try:
+        found = list_feed_entries(subscription)
+    except Exception as e:
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute('UPDATE subscriptions SET last_polled = ?, last_error = ? WHERE id = ?',
+                     (now, str(e), subscription_id))
+        conn.commit()
+        conn.close()
+        print(f"Error polling subscription {subscription['url']}: {e}")
+        return
+    
+    seen = []
+    new_entries = []
+    for info in found:
+        extractor = info['ie_key'] or info['extractor_key']
+        url = info['url'] or info['webpage_url']
+        if not info['id'] or not extractor or not url:
+            continue
+        seen.append(yt_dlp.utils.make_archive_id(extractor, info['id']))
+        new_entries.append(info)
+    
+    # The first poll only marks the feed's current entries as seen, apart from the backfill
+    if not subscription['last_polled']:
+        backfill = subscription['backfill'] or 0
+        if subscription['newest_first']:
+            new_entries = new_entries[:backfill]
+        else:
+            new_entries = new_entries[max(len(new_entries) - backfill, 0):]
+    if subscription['newest_first']:
+        new_entries.reverse()  # Oldest new entry downloads first
+    
+    title = subscription['title'] or next((i['playlist_title'] for i in found if i['playlist_title']), '')
+    options = json.loads(subscription['options'])
+    batch_id = str(uuid.uuid4()) if new_entries else ''
+    register_thumbnails(*(info['thumbnail'] for info in new_entries))
+    jobs = []
+    for info in new_entries:
+        dl = DownloadProgress(str(uuid.uuid4()), url=info['url'] or info['webpage_url'], **options)
+        dl.status = 'queued'
+        dl.batch_id = batch_id
+        dl.title = info['title'] or ''
+        dl.thumbnail = info['thumbnail'] or ''
+        dl.playlist_title = title
+        jobs.append(dl)
+    
+    # Seen ids, queued jobs and poll status land together, so a crash can
+    # neither lose new entries nor queue them twice
+    conn = sqlite3.connect(DATABASE_PATH)
+    try:
+        with conn:
+            conn.executemany('''
+                INSERT OR IGNORE INTO subscription_seen (subscription_id, archive_id, seen_at) VALUES (?, ?, ?)
+            ''', [(subscription_id, archive_id, now) for archive_id in seen])
+            if jobs:
+                write_batch(conn, batch_id, options, len(jobs), [dl.journal_entry() for dl in jobs])
+            conn.execute('''
+                UPDATE subscriptions SET title = ?, last_polled = ?, last_new = ?, last_error = NULL WHERE id = ?
+            ''', (title, now, len(jobs), subscription_id))
+    finally:
+        conn.close()
+    
+    if jobs:
+        with download_lock:
+            for dl in jobs:
+                downloads[dl.download_id] = dl
+            batch_jobs[batch_id] = [dl.download_id for dl in jobs]
+        enqueue_downloads([dl.download_id for dl in jobs])
+        print(f"Queued {len(jobs)} new item(s) from {title or subscription['url']}")
+
+
+class SubscriptionPoller:
+    """Background thread that polls subscriptions as they fall due
+    
+    Due times live in SQLite, so the schedule survives restarts and the
+    thread only ever looks at the next due feed.
+    """
+    def __init__(self, concurrency=SUBSCRIPTION_POLL_CONCURRENCY):
+        self.slots = threading.Semaphore(concurrency)
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+    
+    def start(self):
+        """Start the polling thread (once)"""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+    
+    def wake(self):
+        """Re-check due times now, e.g. after a subscription was added"""
+        self.wakeup.set()
+    
+    def run(self):
+        while True:
+            self.slots.acquire()
+            self.wakeup.clear()
             try:
-                ydl.download([url])
-            except yt_dlp.utils.DownloadError as e:
-                # Check if it's just a subtitle error
-                error_str = str(e).lower()
-                if 'subtitle' in error_str or '429' in error_str:
-                    # Subtitle download failed but video may have succeeded
+                subscription, wait = claim_due_subscription()
+            except Exception as e:
+                print(f"Error reading subscriptions: {e}")
+                subscription, wait = None, SUBSCRIPTION_IDLE_CHECK
+            
+            if subscription is None:
+                self.slots.release()
+                self.wakeup.wait(min(wait if wait is not None else SUBSCRIPTION_IDLE_CHECK,
+                                     SUBSCRIPTION_IDLE_CHECK))
+                continue
+            
+            thread = threading.Thread(target=self.poll, args=(subscription,))
+            thread.daemon = True
+            thread.start()
+    
+    def poll(self, subscription):
+        try:
+            poll_subscription(subscription)
+        finally:
+            self.slots.release()
+
+
+subscription_poller = SubscriptionPoller()
+
+
+# Scheduled jobs wait in SQLite, not in the job journal, until they are
+# released; releasing journals the job and removes (or, for recurring jobs,
+# advances) the schedule row in one transaction, so a restart neither loses
+# nor duplicates a run.
+ACTIVE_STATUSES = ['pending', 'starting', 'downloading', 'processing', 'retrying', 'waiting']
+SCHEDULE_SPEC_FIELDS = ['url', 'quality', 'audio_only', 'audio_format', 'download_subs', 'sub_lang', 'embed_subs']
+
+
+def parse_clock(value):
+    """Minutes after midnight of an "HH:MM" time"""
+    match = re.fullmatch(r'(\d{1,2}):(\d{2})', str(value or '').strip())
+    if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+        raise ValueError(f'Invalid time of day: {value!r}')
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+def parse_timestamp(value):
+    """Epoch seconds from an epoch number or an ISO 8601 string"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        raise ValueError(f'Invalid date/time: {value!r}')
+
+
+def resolve_window(spec):
+    """A named or inline time window as a normalized dict"""
+    if isinstance(spec, str):
+        if spec not in SCHEDULE_WINDOWS:
+            raise ValueError(f'Unknown schedule window: {spec}')
+        window = dict(SCHEDULE_WINDOWS[spec], name=spec)
+    elif isinstance(spec, dict):
+        window = {
+            'start': spec.get('start'),
+            'end': spec.get('end'),
+            'days': spec.get('days', list(range(7))),
+            'concurrency': spec.get('concurrency', SCHEDULE_DEFAULT_CONCURRENCY),
+            'rate_limit': spec.get('rate_limit', 0),
+        }
+    else:
+        raise ValueError('Schedule window must be a name or an object')
+    
+    parse_clock(window['start'])
+    parse_clock(window['end'])
+    try:
+        window['days'] = sorted({int(d) for d in window['days'] if 0 <= int(d) <= 6})
+        window['concurrency'] = max(1, int(window['concurrency']))
+        window['rate_limit'] = max(0, int(window['rate_limit'] or 0))
+    except (TypeError, ValueError):
+        raise ValueError('Invalid schedule window')
+    if not window['days']:
+        raise ValueError('Schedule window needs at least one day')
+    if 'name' not in window:
+        # Jobs given the same inline window share its concurrency limit
+        window['name'] = 'custom-' + hashlib.sha1(json.dumps(window, sort_keys=True).encode()).hexdigest()[:8]
+    return window
+
+
+def window_opens_at(window, after):
+    """The first time at or after `after` that falls inside the window"""
+    start = parse_clock(window['start'])
+    length = (parse_clock(window['end']) - start) % 1440 or 1440  # End before start wraps past midnight
+    day = datetime.fromtimestamp(after).date()
+    # Yesterday's occurrence may still be open
+    for offset in range(-1, 8):
+        date = day + timedelta(days=offset)
+        if date.weekday() not in window['days']:
+            continue
+        opens = datetime.combine(date, datetime.min.time()) + timedelta(minutes=start)
+        closes = opens + timedelta(minutes=length)
+        if closes.timestamp() > after:
+            return max(opens.timestamp(), after)
+    return None
+
+
+def parse_schedule(spec):
+    """Validate a request's schedule: {not_before, window, repeat}"""
+    if not isinstance(spec, dict):
+        raise ValueError('Schedule must be an object')
+    not_before = parse_timestamp(spec['not_before']) if spec.get('not_before') else time.time()
+    window = resolve_window(spec['window']) if spec.get('window') else None
+    
+    repeat = spec.get('repeat') or 0
+    repeat = {'daily': 86400, 'weekly': 7 * 86400}.get(repeat, repeat)
+    try:
+        repeat = int(repeat)
+    except (TypeError, ValueError):
+        raise ValueError(f'Invalid repeat interval: {repeat!r}')
+    if repeat and repeat < SCHEDULE_MIN_REPEAT:
+        raise ValueError(f'Jobs can repeat at most once every {SCHEDULE_MIN_REPEAT} seconds')
+    return {'not_before': not_before, 'window': window, 'repeat': repeat}
+
+
+def first_run_time(not_before, window):
+    """When a job due at not_before can actually start"""
+    return window_opens_at(window, not_before) if window else not_before
+
+
+def scheduled_download(download_id, spec, next_run):
+    """Placeholder tracker shown for a job that hasn't been released yet"""
+    dl = DownloadProgress(download_id, **spec)
+    dl.status = 'scheduled'
+    dl.scheduled_for = next_run
+    return dl
+
+
+def schedule_downloads(specs, schedule):
+    """Persist jobs to be released later, returns [(schedule_id, download_id, next_run)]"""
+    now = time.time()
+    window = schedule['window']
+    next_run = first_run_time(schedule['not_before'], window)
+    rows = [(str(uuid.uuid4()), str(uuid.uuid4()), json.dumps(spec), json.dumps(window) if window else None,
+             schedule['repeat'], schedule['not_before'], next_run, now) for spec in specs]
+    
+    conn = sqlite3.connect(DATABASE_PATH)
+    try:
+        with conn:
+            conn.executemany('''
+                INSERT INTO scheduled_jobs (id, download_id, spec, window, repeat, not_before, next_run, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+    finally:
+        conn.close()
+    
+    with download_lock:
+        for row, spec in zip(rows, specs):
+            downloads[row[1]] = scheduled_download(row[1], spec, next_run)
+    job_scheduler.wake()
+    return [(row[0], row[1], next_run) for row in rows]
+
+
+def count_window_jobs(window_name):
+    """Released jobs of a window that are still running"""
+    with download_lock:
+        return sum(1 for dl in downloads.values() if dl.window == window_name and dl.status in ACTIVE_STATUSES)
+
+
+def release_scheduled_job(row, window):
+    """Move a due job into the journal and start it, returns False if it was already taken"""
+    now = time.time()
+    spec = json.loads(row['spec'])
+    dl = DownloadProgress(row['download_id'], **spec)
+    if window:
+        dl.window = window['name']
+        dl.rate_limit = window['rate_limit'] // window['concurrency']
+    
+    next_download_id = str(uuid.uuid4())
+    not_before = next_run = None
+    if row['repeat']:
+        not_before = row['not_before'] + row['repeat']
+        while not_before <= now:
+            not_before += row['repeat']  # Skip runs missed while the server was down
+        next_run = first_run_time(not_before, window)
+    
+    conn = sqlite3.connect(DATABASE_PATH)
+    try:
+        with conn:
+            # Matching on download_id makes a release happen at most once per run
+            if row['repeat']:
+                cursor = conn.execute('''
+                    UPDATE scheduled_jobs SET download_id = ?, not_before = ?, next_run = ?, runs = runs + 1,
+                    last_run = ? WHERE id = ? AND download_id = ?
+                ''', (next_download_id, not_before, next_run, now, row['id'], row['download_id']))
+            else:
+                cursor = conn.execute('DELETE FROM scheduled_jobs WHERE id = ? AND download_id = ?',
+                                      (row['id'], row['download_id']))
+            if not cursor.rowcount:
+                return False
+            write_jobs(conn, [dl.journal_entry()])
+    finally:
+        conn.close()
+    
+    with download_lock:
+        downloads[dl.download_id] = dl
+        if row['repeat']:
+            downloads[next_download_id] = scheduled_download(next_download_id, spec, next_run)
+    submit_download(dl.download_id)
+    return True
+
+
+def load_scheduled_jobs():
+    """Show jobs scheduled before a restart as waiting"""
+    conn = sqlite3.connect(DATABASE_PATH)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    cursor.execute('SELECT download_id, spec, next_run FROM scheduled_jobs')
+    rows = cursor.fetchall()
+    conn.close()
+    with download_lock:
+        for row in rows:
+            if row['download_id'] not in downloads:
+                downloads[row['download_id']] = scheduled_download(
+                    row['download_id'], json.loads(row['spec']), row['next_run'])
+
+
+class JobScheduler:
+    """Background thread that releases scheduled jobs when they are due
+    
+    A job with a window only starts while the window is open and fewer than
+    the window's concurrency of its jobs are running; once started it is
+    allowed to finish after the window closes.
+    """
+    def __init__(self):
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+    
+    def start(self):
+        """Load persisted jobs and start the scheduling thread (once)"""
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+        try:
+            load_scheduled_jobs()
+        except Exception as e:
+            print(f"Error loading scheduled jobs: {e}")
+        self.thread.start()
+    
+    def wake(self):
+        """Re-check due jobs now"""
+        self.wakeup.set()
+    
+    def run(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                wait = self.release_due_jobs()
+            except Exception as e:
+                print(f"Error releasing scheduled jobs: {e}")
+                wait = SCHEDULER_CHECK_INTERVAL
+            self.wakeup.wait(wait)
+    
+    def release_due_jobs(self):
+        """Release what can run now, returns seconds until the next check"""
+        now = time.time()
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM scheduled_jobs WHERE next_run <= ? ORDER BY next_run LIMIT 500', (now,))
+        rows = cursor.fetchall()
+        
+        blocked = False
+        full = set()  # Windows already at their concurrency limit
+        for row in rows:
+            window = json.loads(row['window']) if row['window'] else None
+            if window:
+                opens = window_opens_at(window, now)
+                if opens > now:
+                    # Closed since the job became due, sleep until it opens again
+                    conn.execute('UPDATE scheduled_jobs SET next_run = ? WHERE id = ?', (opens, row['id']))
+                    conn.commit()
                     with download_lock:
-                        if download_id in downloads:
-                            dl = downloads[download_id]
-                            dl.warning = 'Subtitles unavailable (rate limited), video downloaded successfully'
-                else:
-                    raise  # Re-raise if it's a real download error
+                        if row['download_id'] in downloads:
+                            downloads[row['download_id']].scheduled_for = opens
+                    continue
+                if window['name'] in full or count_window_jobs(window['name']) >= window['concurrency']:
+                    full.add(window['name'])
+                    blocked = True
+                    continue
+            release_scheduled_job(row, window)
+        
+        cursor.execute('SELECT MIN(next_run) FROM scheduled_jobs WHERE next_run > ?', (now,))
+        next_run = cursor.fetchone()[0]
+        conn.close()
         
-        # Save to history
-        with download_lock:
-            if download_id in downloads:
-                dl = downloads[download_id]
-                dl.status = 'completed'
-                dl.progress = 100
-                dl.is_merging = False
-                dl.speed = ''
-                dl.eta = ''
-                
-                # Get filesize
-                filesize = 0
-                if dl.filename:
-                    filepath = os.path.join(DOWNLOAD_FOLDER, dl.filename)
-                    if os.path.exists(filepath):
-                        filesize = os.path.getsize(filepath)
-                
-                save_to_history(
-                    download_id=download_id,
-                    url=url,
-                    title=dl.title,
-                    thumbnail=dl.thumbnail,
-                    uploader=dl.uploader,
-                    duration=dl.duration,
-                    quality=quality,
-                    format_type='audio' if audio_only else 'video',
-                    audio_format=audio_format if audio_only else None,
-                    filename=dl.filename,
-                    filesize=filesize,
-                    status='completed'
-                )
-            
+        if len(rows) == 500 and not blocked:
+            return 0  # More due jobs than one pass takes
+        # Slots free up as jobs finish, so check periodically even when nothing is due
+        if next_run is None:
+            return SCHEDULER_CHECK_INTERVAL
+        return min(max(next_run - time.time(), 0), SCHEDULER_CHECK_INTERVAL)
+
+
+job_scheduler = JobScheduler()
+
+
+def partial_file_prefix(filename):
+    """Name prefix shared by a download's output and its partial/fragment files"""
+    # "Title.f137.mp4" -> "Title.", "Title.mp4" -> "Title."
+    return re.sub(r'(\.f[\w-]+)?\.[^.]+$', '', filename) + '.'
+
+
+def collect_orphan_partials(owned_prefixes):
+    """Delete partial download files that no journaled job will resume"""
+    now = time.time()
+    for filepath in walk_library():
+        name = os.path.basename(filepath)
+        if not is_partial_file(name):
+            continue
+        if any(name.startswith(prefix) for prefix in owned_prefixes):
+            continue
+        try:
+            # Leave recent files alone in case another process is still writing them
+            if now - os.path.getmtime(filepath) < PARTIAL_FILE_GRACE:
+                continue
+            os.remove(filepath)
+            print(f"Removed orphaned partial file: {name}")
+        except OSError as e:
+            print(f"Error removing partial file {name}: {e}")
+
+
+def recover_jobs():
+    """Re-register downloads interrupted by a restart and resume them
+    
+    yt-dlp continues from the .part files the jobs left behind. Partial
+    files that no journaled job owns are garbage-collected. Only runs in
+    the process holding the services lock (see start_background_services).
+    """
+    global jobs_recovered
+    with recovery_lock:
+        if jobs_recovered:
+            return
+        jobs_recovered = True
+    
+    try:
+        rows = load_journal()
     except Exception as e:
+        print(f"Error reading job journal: {e}")
+        return
+    
+    owned_prefixes = []
+    for row in rows:
+        dl = DownloadProgress(
+            row['id'],
+            url=row['url'],
+            quality=row['quality'] or 'best',
+            audio_only=bool(row['audio_only']),
+            audio_format=row['audio_format'] or 'mp3',
+            download_subs=bool(row['download_subs']),
+            sub_lang=row['sub_lang'] or 'en',
+            embed_subs=bool(row['embed_subs']),
+            is_playlist=bool(row['is_playlist'])
+        )
+        dl.playlist_index = row['playlist_index'] or 0
+        dl.playlist_count = row['playlist_count'] or 0
+        dl.playlist_title = row['playlist_title'] or ''
+        dl.title = row['title'] or ''
+        dl.thumbnail = row['thumbnail'] or ''
+        dl.filename = row['filename'] or ''
+        dl.progress = row['progress'] or 0
+        dl.retry_count = row['retry_count'] or 0
+        dl.batch_id = row['batch_id'] or ''
+        dl.window = row['window'] or ''
+        dl.rate_limit = row['rate_limit'] or 0
+        dl.resumed = True
+        if dl.batch_id:
+            dl.status = 'queued'
         with download_lock:
-            if download_id in downloads:
-                dl = downloads[download_id]
-                dl.status = 'error'
-                dl.error = str(e)
-                
-                save_to_history(
-                    download_id=download_id,
-                    url=url,
-                    title=dl.title,
-                    thumbnail=dl.thumbnail,
-                    uploader=dl.uploader,
-                    duration=dl.duration,
-                    quality=quality,
-                    format_type='audio' if audio_only else 'video',
-                    audio_format=audio_format if audio_only else None,
-                    filename=dl.filename,
-                    filesize=0,
-                    status='error',
-                    error=str(e)
-                )
+            downloads[dl.download_id] = dl
+            if dl.batch_id:
+                batch_jobs.setdefault(dl.batch_id, []).append(dl.download_id)
+        if dl.filename:
+            owned_prefixes.append(partial_file_prefix(dl.filename))
+    
+    collect_orphan_partials(owned_prefixes)
+    
+    # Bulk jobs go back through the queue so they don't all start at once
+    enqueue_downloads([row['id'] for row in rows if row['batch_id']])
+    for row in rows:
+        if not row['batch_id']:
+            submit_download(row['id'])
+    if rows:
+        print(f"Resumed {len(rows)} interrupted download(s)")
+
+
+def acquire_services_lock():
+    """Take the lock file that makes this the one process running background services"""
+    global services_lock_file
+    if fcntl is None:
+        return True
+    f = open(SERVICES_LOCK_PATH, 'a+')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    services_lock_file = f  # Released by the OS when the process exits
+    return True
+
+
+def start_background_services():
+    """Index the library, resume interrupted jobs and start the scheduler and subscription poller
+    
+    Called once at server start by each entry point (__main__, asgi.py,
+    gunicorn.conf.py). Recovery resumes every journaled job and deletes
+    partial files no job owns, so a second process sharing the download
+    folder would download into the same .part files and delete the other's
+    in-flight ones; only the process holding SERVICES_LOCK_PATH runs them.
+    """
+    global services_started
+    with recovery_lock:
+        if services_started:
+            return
+        services_started = True
+    if not acquire_services_lock():
+        print("Background services are run by another process (see README: run a single worker)")
+        return
+    
+    # Picks up files from before the index and ones added or removed by hand
+    added, removed = sync_library_index()
+    if added or removed:
+        print(f"Library index: {added} file(s) added, {removed} missing file(s) dropped")
+    recover_jobs()
+    job_scheduler.start()
+    subscription_poller.start()
+
+
+def negotiate_encoding():
+    """Pick the best content encoding the client accepts"""
+    offered = ['br', 'gzip'] if brotli else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+@app.after_request
+def compress_response(response):
+    """Compress JSON/HTML responses with brotli or gzip when the client accepts it"""
+    # Files and SSE streams are passed through untouched
+    if (response.direct_passthrough or response.is_streamed
+            or not 200 <= response.status_code < 300
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESS_MIMETYPES):
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    if not encoding:
+        return response
+    
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    
+    if encoding == 'br':
+        data = brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL)
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+    return response
 
 
 @app.route('/')
@@ -640,8 +3850,14 @@ def get_info():
         if not url:
             return jsonify({'error': 'URL is required'}), 400
         
-        info = get_video_info(url)
-        return jsonify(info)
+        # formats: 'full' (default), 'ladder' or 'none'; fields: projection of top-level keys
+        format_mode = data.get('formats') or request.args.get('formats', 'full')
+        if format_mode not in ('full', 'ladder', 'none'):
+            return jsonify({'error': 'formats must be one of full, ladder, none'}), 400
+        fields = parse_fields(data.get('fields') or request.args.get('fields'))
+        
+        info = get_video_info(url, format_mode=format_mode)
+        return jsonify(project_fields(info, fields))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -663,6 +3879,20 @@ def start_download():
         if not url:
             return jsonify({'error': 'URL is required'}), 400
         
+        if data.get('schedule'):
+            try:
+                schedule = parse_schedule(data['schedule'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            spec = {'url': url, 'quality': quality, 'audio_only': audio_only, 'audio_format': audio_format,
+                    'download_subs': download_subs, 'sub_lang': sub_lang, 'embed_subs': embed_subs}
+            [(schedule_id, download_id, next_run)] = schedule_downloads([spec], schedule)
+            return jsonify({
+                'download_id': download_id,
+                'schedule_id': schedule_id,
+                'scheduled_for': datetime.fromtimestamp(next_run).isoformat(),
+            })
+        
         # Create download ID
         download_id = str(uuid.uuid4())
         
@@ -680,13 +3910,7 @@ def start_download():
             )
         
         # Start download in background
-        thread = threading.Thread(
-            target=download_video,
-            args=(url, download_id, 'best', quality, audio_only, audio_format, 
-                  download_subs, sub_lang, embed_subs)
-        )
-        thread.daemon = True
-        thread.start()
+        submit_download(download_id)
         
         return jsonify({'download_id': download_id})
         
@@ -713,6 +3937,22 @@ def batch_download():
         if len(urls) > 20:
             return jsonify({'error': 'Maximum 20 URLs allowed per batch'}), 400
         
+        if data.get('schedule'):
+            try:
+                schedule = parse_schedule(data['schedule'])
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            specs = [{'url': url.strip(), 'quality': quality, 'audio_only': audio_only,
+                      'audio_format': audio_format, 'download_subs': download_subs, 'sub_lang': sub_lang,
+                      'embed_subs': embed_subs} for url in urls if url.strip()]
+            scheduled = schedule_downloads(specs, schedule)
+            return jsonify({
+                'download_ids': [download_id for _, download_id, _ in scheduled],
+                'schedule_ids': [schedule_id for schedule_id, _, _ in scheduled],
+                'count': len(scheduled),
+                'scheduled_for': datetime.fromtimestamp(scheduled[0][2]).isoformat() if scheduled else None,
+            })
+        
         download_ids = []
         
         for url in urls:
@@ -738,13 +3978,7 @@ def batch_download():
                 )
             
             # Start download in background
-            thread = threading.Thread(
-                target=download_video,
-                args=(url, download_id, 'best', quality, audio_only, audio_format,
-                      download_subs, sub_lang, embed_subs)
-            )
-            thread.daemon = True
-            thread.start()
+            submit_download(download_id)
         
         return jsonify({'download_ids': download_ids, 'count': len(download_ids)})
         
@@ -752,6 +3986,278 @@ def batch_download():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/schedule')
+def list_scheduled_jobs():
+    """List jobs waiting for their scheduled time or window"""
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        offset = request.args.get('offset', 0, type=int)
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM scheduled_jobs ORDER BY next_run LIMIT ? OFFSET ?', (limit, offset))
+        rows = cursor.fetchall()
+        conn.close()
+        return jsonify([{
+            'schedule_id': row['id'],
+            'download_id': row['download_id'],
+            **json.loads(row['spec']),
+            'window': json.loads(row['window']) if row['window'] else None,
+            'repeat': row['repeat'],
+            'next_run': datetime.fromtimestamp(row['next_run']).isoformat(),
+            'runs': row['runs'],
+            'last_run': datetime.fromtimestamp(row['last_run']).isoformat() if row['last_run'] else None,
+        } for row in rows])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/schedule/<schedule_id>', methods=['DELETE'])
+def cancel_scheduled_job(schedule_id):
+    """Cancel a scheduled job (and all future runs of a recurring one)"""
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        cursor = conn.cursor()
+        cursor.execute('SELECT download_id FROM scheduled_jobs WHERE id = ?', (schedule_id,))
+        row = cursor.fetchone()
+        if row is None:
+            conn.close()
+            return jsonify({'error': 'Scheduled job not found'}), 404
+        cursor.execute('DELETE FROM scheduled_jobs WHERE id = ?', (schedule_id,))
+        conn.commit()
+        conn.close()
+        with download_lock:
+            dl = downloads.get(row[0])
+            if dl and dl.status == 'scheduled':
+                del downloads[row[0]]
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/bulk-download', methods=['POST'])
+def bulk_download():
+    """Queue a large list of URLs from a streamed text or NDJSON upload"""
+    try:
+        # Options come from the query string, the body is the URL list
+        args = request.args
+        options = {
+            'quality': args.get('quality', 'best'),
+            'audio_only': args.get('audio_only', 'false').lower() in ('1', 'true', 'yes'),
+            'audio_format': args.get('audio_format', 'mp3'),
+            'download_subs': args.get('download_subs', 'false').lower() in ('1', 'true', 'yes'),
+            'sub_lang': args.get('sub_lang', 'en'),
+            'embed_subs': args.get('embed_subs', 'false').lower() in ('1', 'true', 'yes'),
+        }
+        skip_downloaded = args.get('skip_downloaded', 'false').lower() in ('1', 'true', 'yes')
+        ndjson = request.mimetype in ('application/x-ndjson', 'application/jsonl', 'application/json-seq')
+        
+        urls = {}  # normalized -> None, keeps upload order
+        invalid = 0
+        duplicates = 0
+        for url in read_bulk_urls(request.stream, ndjson):
+            normalized = normalize_url(url) if isinstance(url, str) else None
+            if normalized is None:
+                invalid += 1
+            elif normalized in urls:
+                duplicates += 1
+            else:
+                if len(urls) >= BULK_MAX_URLS:
+                    return jsonify({'error': f'Maximum {BULK_MAX_URLS} URLs allowed per bulk upload'}), 400
+                urls[normalized] = None
+        
+        skipped = 0
+        if skip_downloaded and urls:
+            downloaded = get_downloaded_urls(urls)
+            skipped = len(downloaded)
+            for url in downloaded:
+                del urls[url]
+        
+        if not urls:
+            return jsonify({'error': 'No new valid URLs in upload', 'invalid': invalid,
+                            'duplicates': duplicates, 'skipped_downloaded': skipped}), 400
+        
+        batch_id = str(uuid.uuid4())
+        jobs = []
+        for url in urls:
+            dl = DownloadProgress(str(uuid.uuid4()), url=url, **options)
+            dl.status = 'queued'
+            dl.batch_id = batch_id
+            jobs.append(dl)
+        
+        # Everything is persisted in one transaction before anything is registered or started
+        journal_batch(batch_id, options, len(jobs), [dl.journal_entry() for dl in jobs])
+        
+        with download_lock:
+            for dl in jobs:
+                downloads[dl.download_id] = dl
+            batch_jobs[batch_id] = [dl.download_id for dl in jobs]
+        enqueue_downloads([dl.download_id for dl in jobs])
+        
+        return jsonify({
+            'batch_id': batch_id,
+            'accepted': len(jobs),
+            'duplicates': duplicates,
+            'invalid': invalid,
+            'skipped_downloaded': skipped,
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/bulk-download/<batch_id>')
+def bulk_download_progress(batch_id):
+    """Get aggregate progress of a bulk batch"""
+    try:
+        progress = get_batch_progress(batch_id)
+        if progress is None:
+            return jsonify({'error': 'Batch not found'}), 404
+        return jsonify(progress)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def subscription_to_dict(row):
+    """Subscription as returned by the API"""
+    return {
+        'id': row['id'],
+        'url': row['url'],
+        'title': row['title'] or '',
+        'options': json.loads(row['options'] or '{}'),
+        'interval': row['interval'],
+        'newest_first': bool(row['newest_first']),
+        'backfill': row['backfill'],
+        'enabled': bool(row['enabled']),
+        'next_poll': datetime.fromtimestamp(row['next_poll']).isoformat() if row['next_poll'] else None,
+        'last_polled': datetime.fromtimestamp(row['last_polled']).isoformat() if row['last_polled'] else None,
+        'last_new': row['last_new'],
+        'last_error': row['last_error'],
+    }
+
+
+def parse_interval(value):
+    """Poll interval in seconds from a request, clamped to the minimum"""
+    try:
+        interval = int(value)
+    except (TypeError, ValueError):
+        interval = SUBSCRIPTION_DEFAULT_INTERVAL
+    return max(interval, SUBSCRIPTION_MIN_INTERVAL)
+
+
+@app.route('/api/subscriptions')
+def list_subscriptions():
+    """List subscriptions"""
+    try:
+        limit = min(request.args.get('limit', 50, type=int), 500)
+        offset = request.args.get('offset', 0, type=int)
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM subscriptions ORDER BY created_at DESC LIMIT ? OFFSET ?', (limit, offset))
+        rows = cursor.fetchall()
+        conn.close()
+        return jsonify([subscription_to_dict(row) for row in rows])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/subscriptions', methods=['POST'])
+def create_subscription():
+    """Subscribe to a channel or playlist and download its new uploads"""
+    try:
+        data = request.get_json() or {}
+        url = normalize_url(data.get('url', '') or '')
+        if not url:
+            return jsonify({'error': 'A valid URL is required'}), 400
+        
+        options = {
+            'quality': data.get('quality', 'best'),
+            'audio_only': bool(data.get('audio_only', False)),
+            'audio_format': data.get('audio_format', 'mp3'),
+            'download_subs': bool(data.get('download_subs', False)),
+            'sub_lang': data.get('sub_lang', 'en'),
+            'embed_subs': bool(data.get('embed_subs', False)),
+        }
+        try:
+            backfill = max(0, min(int(data.get('backfill', 0)), SUBSCRIPTION_FIRST_POLL_ITEMS))
+        except (TypeError, ValueError):
+            backfill = 0
+        
+        subscription_id = str(uuid.uuid4())
+        now = time.time()
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute('''
+            INSERT INTO subscriptions (id, url, title, options, interval, newest_first, backfill,
+                                       enabled, next_poll, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?)
+        ''', (subscription_id, url, data.get('title', ''), json.dumps(options),
+              parse_interval(data.get('interval')), int(bool(data.get('newest_first', True))),
+              backfill, now, now))
+        conn.commit()
+        conn.close()
+        
+        # First poll right away
+        subscription_poller.wake()
+        return jsonify(subscription_to_dict(get_subscription(subscription_id)))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/subscriptions/<subscription_id>', methods=['PATCH'])
+def update_subscription(subscription_id):
+    """Pause/resume a subscription or change its poll interval"""
+    try:
+        subscription = get_subscription(subscription_id)
+        if subscription is None:
+            return jsonify({'error': 'Subscription not found'}), 404
+        data = request.get_json() or {}
+        enabled = bool(data.get('enabled', subscription['enabled']))
+        interval = parse_interval(data.get('interval', subscription['interval']))
+        
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.execute('UPDATE subscriptions SET enabled = ?, interval = ?, title = ? WHERE id = ?',
+                     (int(enabled), interval, data.get('title', subscription['title']), subscription_id))
+        conn.commit()
+        conn.close()
+        subscription_poller.wake()
+        return jsonify(subscription_to_dict(get_subscription(subscription_id)))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/subscriptions/<subscription_id>', methods=['DELETE'])
+def delete_subscription(subscription_id):
+    """Unsubscribe (already queued downloads keep running)"""
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        with conn:
+            cursor = conn.execute('DELETE FROM subscriptions WHERE id = ?', (subscription_id,))
+            conn.execute('DELETE FROM subscription_seen WHERE subscription_id = ?', (subscription_id,))
+        conn.close()
+        if not cursor.rowcount:
+            return jsonify({'error': 'Subscription not found'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/subscriptions/<subscription_id>/poll', methods=['POST'])
+def poll_subscription_now(subscription_id):
+    """Poll a subscription as soon as a slot is free"""
+    try:
+        conn = sqlite3.connect(DATABASE_PATH)
+        cursor = conn.execute('UPDATE subscriptions SET next_poll = ? WHERE id = ?', (time.time(), subscription_id))
+        conn.commit()
+        conn.close()
+        if not cursor.rowcount:
+            return jsonify({'error': 'Subscription not found'}), 404
+        subscription_poller.wake()
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/playlist-download', methods=['POST'])
 def playlist_download():
     """Download a playlist"""
@@ -769,13 +4275,18 @@ def playlist_download():
         if not url:
             return jsonify({'error': 'URL is required'}), 400
         
-        # Get playlist info
-        info = get_video_info(url)
-        
-        if not info.get('is_playlist'):
-            return jsonify({'error': 'URL is not a playlist'}), 400
-        
-        entries = info.get('entries', [])
+        # Entries already fetched through /api/info can be passed back in to
+        # avoid extracting the playlist a second time
+        entries = data.get('entries')
+        playlist_title = data.get('playlist_title', 'Playlist')
+        if not isinstance(entries, list) or not entries:
+            info = get_video_info(url)
+            
+            if not info.get('is_playlist'):
+                return jsonify({'error': 'URL is not a playlist'}), 400
+            
+            entries = info.get('entries', [])
+            playlist_title = info.get('playlist_title', 'Playlist')
         
         # Filter by selected indices if provided
         if selected_indices:
@@ -784,10 +4295,22 @@ def playlist_download():
         if len(entries) > 50:
             entries = entries[:50]  # Limit to 50 videos
         
+        try:
+            concurrency = int(data.get('concurrency', PLAYLIST_CONCURRENCY))
+        except (TypeError, ValueError):
+            concurrency = PLAYLIST_CONCURRENCY
+        concurrency = max(1, min(concurrency, PLAYLIST_MAX_CONCURRENCY))
+        
         download_ids = []
-        playlist_title = info.get('playlist_title', 'Playlist')
+        jobs = []
+        # Thumbnails in a posted entry list are only kept if /api/info registered
+        # them, the real one is filled in when each entry is extracted
+        known_thumbnails = registered_thumbnails(
+            [entry.get('thumbnail', '') for entry in entries if isinstance(entry, dict)])
         
         for idx, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
             video_url = entry.get('url') or entry.get('webpage_url')
             if not video_url:
                 continue
@@ -795,6 +4318,7 @@ def playlist_download():
             # Create download ID
             download_id = str(uuid.uuid4())
             download_ids.append(download_id)
+            jobs.append((download_id, video_url))
             
             # Initialize progress tracker
             with download_lock:
@@ -813,17 +4337,20 @@ def playlist_download():
                 dl.playlist_title = playlist_title
                 dl.playlist_index = idx + 1
                 dl.playlist_count = len(entries)
-                dl.thumbnail = entry.get('thumbnail', '')
+                thumbnail = entry.get('thumbnail')
+                dl.thumbnail = thumbnail if is_remote_thumbnail(thumbnail) and thumbnail in known_thumbnails else ''
                 downloads[download_id] = dl
-            
-            # Start download in background (with slight delay to prevent overwhelming)
-            thread = threading.Thread(
-                target=download_video,
-                args=(video_url, download_id, 'best', quality, audio_only, audio_format,
-                      download_subs, sub_lang, embed_subs)
-            )
-            thread.daemon = True
-            thread.start()
+        
+        # Work through the entries with a few shared sessions instead of one thread each
+        if jobs:
+            with download_lock:
+                journal_entries = [downloads[download_id].journal_entry() for download_id in download_ids]
+            journal_jobs(journal_entries)
+            PlaylistExecutor(
+                jobs, quality=quality, audio_only=audio_only, audio_format=audio_format,
+                download_subs=download_subs, sub_lang=sub_lang, embed_subs=embed_subs,
+                concurrency=concurrency
+            ).start()
         
         return jsonify({
             'download_ids': download_ids, 
@@ -842,9 +4369,17 @@ def get_download_history():
         limit = request.args.get('limit', 50, type=int)
         offset = request.args.get('offset', 0, type=int)
         search = request.args.get('search', '')
+        fields = parse_fields(request.args.get('fields'))
         
-        history = get_history(limit=limit, offset=offset, search=search)
-        return jsonify(history)
+        history = get_history(limit=limit, offset=offset, search=search, fields=fields)
+        register_thumbnails(*(item.get('thumbnail') for item in history))
+        for item in history:
+            if item.get('thumbnail'):
+                item['thumbnail_url'] = thumbnail_url(item['thumbnail'], 'small')
+        response = jsonify(history)
+        # The body stays a plain list; pagers read the total from the header
+        response.headers['X-Total-Count'] = str(count_history(search))
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -855,9 +4390,11 @@ def delete_history_item(download_id):
     """Delete a history item"""
     try:
         conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        cursor.execute('DELETE FROM download_history WHERE id = ?', (download_id,))
-        conn.commit()
+        conn.row_factory = sqlite3.Row
+        with conn:
+            cursor = conn.execute(f'SELECT {STATS_COLUMNS} FROM download_history WHERE id = ?', (download_id,))
+            apply_history_stats(conn, cursor.fetchall(), -1)
+            conn.execute('DELETE FROM download_history WHERE id = ?', (download_id,))
         conn.close()
         return jsonify({'success': True})
     except Exception as e:
@@ -871,6 +4408,7 @@ def clear_history():
         conn = sqlite3.connect(DATABASE_PATH)
         cursor = conn.cursor()
         cursor.execute('DELETE FROM download_history')
+        cursor.execute('DELETE FROM history_stats')
         conn.commit()
         conn.close()
         return jsonify({'success': True})
@@ -908,14 +4446,7 @@ def redownload_from_history(download_id):
             )
         
         # Start download
-        thread = threading.Thread(
-            target=download_video,
-            args=(history_item['url'], new_download_id, 'best', 
-                  history_item.get('quality', 'best'), audio_only, 
-                  history_item.get('audio_format', 'mp3'), False, 'en', False)
-        )
-        thread.daemon = True
-        thread.start()
+        submit_download(new_download_id)
         
         return jsonify({'download_id': new_download_id})
         
@@ -941,19 +4472,16 @@ def retry_download(download_id):
             
             # Reset the download state for retry
             download.reset_for_retry()
-            
-            url = download.url
-            quality = download.quality
-            audio_only = download.audio_only
-            audio_format = download.audio_format
+            batch_id = download.batch_id
+            entry = download.journal_entry()
         
-        # Start download in background
-        thread = threading.Thread(
-            target=download_video,
-            args=(url, download_id, 'best', quality, audio_only, audio_format)
-        )
-        thread.daemon = True
-        thread.start()
+        if batch_id:
+            # Journaled now since it may sit in the queue for a while before it starts
+            journal_jobs([entry])
+            record_batch_retry(batch_id)
+        
+        # Start download in background (with all of its original options)
+        resubmit_download(download_id)
         
         return jsonify({'download_id': download_id, 'retry_count': download.retry_count})
         
@@ -992,23 +4520,38 @@ def stream_progress(download_id):
 
 @app.route('/api/downloads')
 def list_downloads():
-    """List all downloaded files"""
-    try:
-        files = []
-        for filename in os.listdir(DOWNLOAD_FOLDER):
-            filepath = os.path.join(DOWNLOAD_FOLDER, filename)
-            if os.path.isfile(filepath):
-                stat = os.stat(filepath)
-                files.append({
-                    'filename': filename,
-                    'size': stat.st_size,
-                    'created': datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                    'modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                })
-        
-        # Sort by modified date, newest first
-        files.sort(key=lambda x: x['modified'], reverse=True)
-        return jsonify(files)
+    """List downloaded files, newest first (optionally one page of them)"""
+    try:
+        limit = request.args.get('limit', -1, type=int)  # -1: no limit
+        offset = request.args.get('offset', 0, type=int)
+        search = request.args.get('search', '')
+        where, params = '', ()
+        if search:
+            where, params = 'WHERE title LIKE ? OR key LIKE ?', (f'%{search}%', f'%{search}%')
+        
+        conn = sqlite3.connect(DATABASE_PATH)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT key, path, title, size, mtime, added_at FROM library_files {where}
+            ORDER BY mtime DESC LIMIT ? OFFSET ?
+        ''', params + (limit, offset))
+        rows = cursor.fetchall()
+        cursor.execute(f'SELECT COUNT(*) FROM library_files {where}', params)
+        total = cursor.fetchone()[0]
+        conn.close()
+        
+        files = [{
+            'filename': row['key'],
+            'title': row['title'] or '',
+            'path': row['path'],
+            'size': row['size'] or 0,
+            'created': datetime.fromtimestamp(row['added_at'] or 0).isoformat(),
+            'modified': datetime.fromtimestamp(row['mtime'] or 0).isoformat(),
+        } for row in rows]
+        response = jsonify(files)
+        response.headers['X-Total-Count'] = str(total)
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1018,27 +4561,241 @@ def list_downloads():
 def download_file(filename):
     """Download a file"""
     try:
-        filepath = os.path.join(DOWNLOAD_FOLDER, filename)
-        if os.path.isfile(filepath):
-            return send_file(filepath, as_attachment=True)
+        entry = get_library_file(filename)
+        if entry:
+            record_file_access(filename)
+            return send_file(entry['abspath'], as_attachment=True, download_name=library_download_name(entry))
         return jsonify({'error': 'File not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def follow_growing_file(download_id, f):
+    """Yield the bytes of a file that is still being written until its download finishes
+    
+    The file object was opened on the .part file; yt-dlp renaming it to its
+    final name doesn't affect the open handle, so reading just continues.
+    """
+    offset = 0
+    try:
+        while True:
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if chunk:
+                offset += len(chunk)
+                yield chunk
+                continue
+            
+            with download_lock:
+                dl = downloads.get(download_id)
+                status = dl.status if dl else 'error'
+                finished = dl.streams_finished > 0 if dl else False
+            
+            size = os.fstat(f.fileno()).st_size
+            if status == 'error' or size < offset:
+                return  # Failed or restarted from scratch - the client sees a short body
+            # yt-dlp closes the file before reporting 'finished', so the size is final
+            if (finished or status == 'completed') and size == offset:
+                return
+            time.sleep(STREAM_POLL_INTERVAL)
+    finally:
+        f.close()
+
+
+@app.route('/api/download/stream/<download_id>')
+def stream_download(download_id):
+    """Serve a single-stream download while it is still downloading"""
+    try:
+        deadline = time.time() + STREAM_START_TIMEOUT
+        while True:
+            with download_lock:
+                if download_id not in downloads:
+                    return jsonify({'error': 'Download not found'}), 404
+                dl = downloads[download_id]
+                status = dl.status
+                total_streams = dl.total_streams
+                tmpfilename = dl.tmpfilename
+                filename = dl.filename
+                filepath = dl.filepath
+                title = dl.title
+                total_bytes = dl.total_bytes
+            
+            if status == 'error':
+                return jsonify({'error': 'Download failed'}), 409
+            if status == 'completed' and filename:
+                # Nothing left to follow, serve the finished file
+                return download_file(filename)
+            # The stream count is only final once bytes start arriving
+            if tmpfilename:
+                break
+            if time.time() > deadline:
+                return jsonify({'error': 'Download has not started yet'}), 504
+            time.sleep(STREAM_POLL_INTERVAL)
+        
+        if total_streams != 1:
+            return jsonify({'error': 'Streaming is only available for downloads that need no merging'}), 409
+        
+        # The .part file may have just been renamed to its final name
+        f = None
+        for path in (tmpfilename, filepath or os.path.join(os.path.dirname(tmpfilename), filename)):
+            try:
+                f = open(path, 'rb')
+                break
+            except OSError:
+                continue
+        if f is None:
+            return jsonify({'error': 'File not found'}), 404
+        
+        download_name = library_download_name({'key': filename, 'title': title})
+        headers = {'Content-Disposition': content_disposition(download_name)}
+        if total_bytes:
+            headers['Content-Length'] = str(total_bytes)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        return Response(follow_growing_file(download_id, f), mimetype=mimetype, headers=headers,
+                        direct_passthrough=True)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/export', methods=['POST'])
+def create_library_export():
+    """Create a ZIP export of library files or of a whole playlist"""
+    try:
+        data = request.get_json() or {}
+        playlist_title = data.get('playlist_title', '')
+        if playlist_title:
+            filenames = get_playlist_files(playlist_title)
+            name = sanitize_filename(playlist_title) or 'playlist'
+        elif data.get('all'):
+            filenames = get_library_keys()
+            name = 'library-' + datetime.now().strftime('%Y%m%d-%H%M%S')
+        else:
+            filenames = data.get('filenames') or []
+            name = 'library-' + datetime.now().strftime('%Y%m%d-%H%M%S')
+        
+        # Only finished files in the library index can be exported
+        filenames = list(dict.fromkeys(
+            f for f in filenames
+            if isinstance(f, str) and f and not is_partial_file(f) and get_library_file(f)
+        ))
+        if not filenames:
+            return jsonify({'error': 'No files to export'}), 400
+        if len(filenames) > EXPORT_MAX_FILES:
+            return jsonify({'error': f'Too many files (max {EXPORT_MAX_FILES})'}), 400
+        
+        export_id = create_export(name, filenames)
+        archive = ZipExport(export_entries(filenames))
+        return jsonify({
+            'export_id': export_id,
+            'url': f'/api/export/{export_id}',
+            'filename': f'{name}.zip',
+            'files': len(archive.entries),
+            'size': archive.size,
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/export/<export_id>')
+def download_library_export(export_id):
+    """Stream a ZIP export, honoring Range requests so interrupted downloads can resume"""
+    try:
+        export = load_export(export_id)
+        if export is None:
+            return jsonify({'error': 'Export not found or expired'}), 404
+        name, filenames = export
+        archive = ZipExport(export_entries(filenames))
+        if not archive.entries:
+            return jsonify({'error': 'Exported files no longer exist'}), 404
+        
+        headers = {
+            'Content-Disposition': content_disposition(f'{name}.zip'),
+            'Accept-Ranges': 'bytes',
+            'ETag': f'"{archive.etag}"',
+        }
+        byte_range = parse_range(request.headers.get('Range'), archive.size)
+        # A resume against files that changed since must start over
+        if_range = request.headers.get('If-Range')
+        if if_range and if_range.strip('"') != archive.etag:
+            byte_range = None
+        
+        if byte_range is False:
+            headers['Content-Range'] = f'bytes */{archive.size}'
+            return Response(status=416, headers=headers)
+        if byte_range is None:
+            start, stop, status = 0, archive.size, 200
+            for filename in filenames:
+                record_file_access(filename)
+        else:
+            start, stop = byte_range
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{stop - 1}/{archive.size}'
+        headers['Content-Length'] = str(stop - start)
+        
+        return Response(archive.iter_bytes(start, stop), status=status, mimetype='application/zip',
+                        headers=headers, direct_passthrough=True)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/api/delete/<filename>', methods=['DELETE'])
 def delete_file(filename):
     """Delete a downloaded file"""
     try:
-        filepath = os.path.join(DOWNLOAD_FOLDER, filename)
-        if os.path.isfile(filepath):
-            os.remove(filepath)
+        entry = get_library_file(filename)
+        if entry:
+            os.remove(entry['abspath'])
+            forget_library_file(filename)
+            prune_empty_dirs(entry['abspath'])
             return jsonify({'success': True})
         return jsonify({'error': 'File not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/stats')
+def history_stats():
+    """Download counts, success rates and bytes by day, uploader and format"""
+    try:
+        days = min(request.args.get('days', STATS_DAYS, type=int), 366)
+        top = min(request.args.get('top', STATS_TOP, type=int), 100)
+        return jsonify(get_history_stats(days=days, top=top))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/storage')
+def storage_usage():
+    """Get library size, quota, reservations and free disk space"""
+    try:
+        return jsonify(storage_manager.usage())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/thumb/<key>')
+def serve_thumbnail(key):
+    """Serve a locally cached, resized thumbnail"""
+    try:
+        if not re.fullmatch(r'[0-9a-f]{32}', key):
+            return jsonify({'error': 'Invalid thumbnail key'}), 400
+        size = request.args.get('size', 'medium')
+        if size not in THUMBNAIL_SIZES:
+            return jsonify({'error': 'Invalid thumbnail size'}), 400
+        
+        use_webp = 'image/webp' in request.headers.get('Accept', '')
+        path = get_cached_thumbnail(key, size, use_webp)
+        if not path:
+            return jsonify({'error': 'Thumbnail not found'}), 404
+        
+        # The key never changes meaning, so browsers may cache it for a long time
+        response = send_file(path, mimetype=get_image_mimetype(path), max_age=THUMBNAIL_CACHE_MAX_AGE)
+        response.headers['Cache-Control'] = f'public, max-age={THUMBNAIL_CACHE_MAX_AGE}, immutable'
+        response.vary.add('Accept')
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 502
+
+
 @app.route('/api/supported-sites')
 def supported_sites():
     """Get list of supported sites"""
@@ -1047,7 +4804,27 @@ def supported_sites():
     return jsonify(sorted(set(sites))[:100])  # Return top 100
 
 
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """Recompute the history statistics from the download history"""
+    rebuild_history_stats()
+    print("History statistics rebuilt")
+
+
+@app.cli.command('migrate-library')
+@click.option('--layout', default=STORAGE_LAYOUT, type=click.Choice(sorted(STORAGE_LAYOUTS)),
+              help='Storage layout to move the library into')
+@click.option('--dry-run', is_flag=True, help='Only print what would be moved')
+def migrate_library_command(layout, dry_run):
+    """Move existing library files into a storage layout"""
+    moved, skipped = migrate_library(layout, dry_run=dry_run)
+    print(f"{'Would move' if dry_run else 'Moved'} {moved} file(s), skipped {skipped}")
+
+
 if __name__ == '__main__':
     print(f"📁 Downloads will be saved to: {DOWNLOAD_FOLDER}")
     print(f"🌐 Starting server at http://localhost:5001")
+    # With the reloader active only the serving child process resumes jobs
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_services()
     app.run(debug=True, host='0.0.0.0', port=5001, threaded=True)
@@ -0,0 +1,227 @@
+"""
+ASGI entry point for the Video Downloader
+Progress streams and status endpoints run on the event loop, so an open
+SSE connection costs a coroutine instead of an OS thread. Every other
+route is handed to the Flask app on a thread pool, which keeps blocking
+yt-dlp work off the loop.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5001
+"""
+
+import re
+import json
+import asyncio
+
+from a2wsgi import WSGIMiddleware
+
+from app import app, downloads, download_lock, start_background_services
+
+# Configuration
+PROGRESS_INTERVAL = 0.5  # Seconds between progress snapshots
+KEEPALIVE_INTERVAL = 15  # Seconds between SSE keepalive comments when nothing changes
+WSGI_WORKERS = 32  # Threads serving the regular Flask routes
+
+STREAM_ROUTE = re.compile(r'/api/progress/stream/([^/]+)')
+PROGRESS_ROUTE = re.compile(r'/api/progress/([^/]+)')
+
+wsgi_app = WSGIMiddleware(app, workers=WSGI_WORKERS)
+
+
+def snapshot(download_ids):
+    """Serialize the current state of the given downloads
+    
+    Takes download_lock, which download threads hold across database writes,
+    so the event loop only ever calls this through asyncio.to_thread().
+    """
+    states = {}
+    with download_lock:
+        for download_id in download_ids:
+            dl = downloads.get(download_id)
+            states[download_id] = dl.to_dict() if dl else None
+
+    result = {}
+    for download_id, data in states.items():
+        if data is None:
+            result[download_id] = (json.dumps({'error': 'Download not found'}), True)
+        else:
+            result[download_id] = (json.dumps(data), data['status'] in ['completed', 'error'])
+    return result
+
+
+class ProgressBroadcaster:
+    """Share one progress poll between every watcher of a download
+
+    A single task snapshots each watched download once per tick and wakes
+    its watchers, so the cost per tick grows with the number of downloads
+    being watched rather than with the number of open connections.
+    """
+    def __init__(self, interval=PROGRESS_INTERVAL):
+        self.interval = interval
+        self.watchers = {}  # download_id -> number of open streams
+        self.latest = {}  # download_id -> (payload, done)
+        self.version = 0
+        self.changed = None
+        self.task = None
+
+    def start(self):
+        """Start the polling task on the running loop"""
+        if self.task is None:
+            self.changed = asyncio.Condition()
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        """Stop the polling task"""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self):
+        """Poll watched downloads and notify their streams"""
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.watchers:
+                continue
+            self.latest.update(await asyncio.to_thread(snapshot, list(self.watchers)))
+            self.version += 1
+            async with self.changed:
+                self.changed.notify_all()
+
+    async def watch(self, download_id):
+        """Yield SSE payloads for a download until it finishes (None means keepalive)"""
+        self.start()
+        self.watchers[download_id] = self.watchers.get(download_id, 0) + 1
+        try:
+            payload, done = (await asyncio.to_thread(snapshot, [download_id]))[download_id]
+            yield payload
+            seen = self.version
+
+            while not done:
+                timed_out = False
+                async with self.changed:
+                    try:
+                        await asyncio.wait_for(
+                            self.changed.wait_for(lambda: self.version != seen),
+                            timeout=KEEPALIVE_INTERVAL
+                        )
+                    except asyncio.TimeoutError:
+                        timed_out = True
+                # Never yield while holding the condition, the client may be slow
+                if timed_out:
+                    yield None
+                    continue
+                seen = self.version
+
+                latest, done = self.latest.get(download_id, (payload, False))
+                # Only send when something actually changed
+                if latest != payload:
+                    payload = latest
+                    yield payload
+        finally:
+            self.watchers[download_id] -= 1
+            if not self.watchers[download_id]:
+                del self.watchers[download_id]
+                self.latest.pop(download_id, None)
+
+
+broadcaster = ProgressBroadcaster()
+
+
+async def send_json(send, data, status=200):
+    """Send a complete JSON response"""
+    body = json.dumps(data).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'access-control-allow-origin', b'*'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def progress_data(download_id):
+    """Current state of one download, or None"""
+    with download_lock:
+        dl = downloads.get(download_id)
+        return dl.to_dict() if dl else None
+
+
+async def get_progress(download_id, send):
+    """Get download progress"""
+    data = await asyncio.to_thread(progress_data, download_id)
+    if data is None:
+        await send_json(send, {'error': 'Download not found'}, 404)
+    else:
+        await send_json(send, data)
+
+
+async def stream_progress(download_id, receive, send):
+    """Stream download progress using Server-Sent Events"""
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'access-control-allow-origin', b'*'),
+        ],
+    })
+
+    async def pump():
+        async for payload in broadcaster.watch(download_id):
+            message = ': keepalive\n\n' if payload is None else f'data: {payload}\n\n'
+            await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+
+    async def wait_for_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    # Stop streaming as soon as either the download finishes or the client goes away
+    pump_task = asyncio.ensure_future(pump())
+    disconnect_task = asyncio.ensure_future(wait_for_disconnect())
+    done, pending = await asyncio.wait([pump_task, disconnect_task], return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+
+    if pump_task in done:
+        pump_task.result()
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+async def lifespan(receive, send):
+    """Start the app's background services and the progress broadcaster with the server"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await asyncio.get_running_loop().run_in_executor(None, start_background_services)
+            broadcaster.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await broadcaster.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    """ASGI application: async progress routes, everything else via Flask"""
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        match = STREAM_ROUTE.fullmatch(scope['path'])
+        if match:
+            await stream_progress(match.group(1), receive, send)
+            return
+        match = PROGRESS_ROUTE.fullmatch(scope['path'])
+        if match:
+            await get_progress(match.group(1), send)
+            return
+
+    await wsgi_app(scope, receive, send)
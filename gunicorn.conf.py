@@ -0,0 +1,18 @@
+"""
+Gunicorn settings for the Video Downloader
+
+    gunicorn app:app
+
+Downloads, their progress and the job journal live in one process, so the
+app runs as a single worker that serves requests from a thread pool.
+"""
+
+bind = '0.0.0.0:5000'
+workers = 1
+threads = 32  # Progress streams hold a thread each
+
+
+def post_worker_init(worker):
+    """Resume interrupted jobs and start the scheduler once the worker is up"""
+    from app import start_background_services
+    start_background_services()
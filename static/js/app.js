@@ -26,8 +26,6 @@ const state = {
     batchAudioFormat: 'mp3',
     batchDownloadSubs: false,
     // History state
-    historyPage: 0,
-    historyLimit: 20,
     historySearch: ''
 };
 
@@ -101,13 +99,10 @@ const elements = {
     clearHistoryBtn: document.getElementById('clear-history-btn'),
     historyEmpty: document.getElementById('history-empty'),
     historyList: document.getElementById('history-list'),
-    historyPagination: document.getElementById('history-pagination'),
-    historyPrev: document.getElementById('history-prev'),
-    historyNext: document.getElementById('history-next'),
-    historyPageInfo: document.getElementById('history-page-info'),
     
     // Library Tab
     refreshLibraryBtn: document.getElementById('refresh-library'),
+    exportLibraryBtn: document.getElementById('export-library'),
     libraryEmpty: document.getElementById('library-empty'),
     libraryFiles: document.getElementById('library-files'),
     
@@ -160,6 +155,14 @@ function formatDate(dateStr) {
     });
 }
 
+function getHost(url) {
+    try {
+        return new URL(url).hostname.replace(/^www\./, '');
+    } catch {
+        return '';
+    }
+}
+
 function getFileExtension(filename) {
     return filename.split('.').pop().toLowerCase();
 }
@@ -169,6 +172,12 @@ function isAudioFile(filename) {
     return audioExts.includes(getFileExtension(filename));
 }
 
+function escapeHtml(text) {
+    return String(text ?? '').replace(/[&<>"']/g, c => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[c]);
+}
+
 // Toast Notifications
 function showToast(message, type = 'info') {
     const toast = document.createElement('div');
@@ -246,7 +255,8 @@ async function fetchVideoInfo() {
         const response = await fetch('/api/info', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ url })
+            // The UI only needs the per-quality summary, not every format
+            body: JSON.stringify({ url, formats: 'ladder' })
         });
         
         const data = await response.json();
@@ -268,7 +278,7 @@ async function fetchVideoInfo() {
 
 function displayVideoInfo(info) {
     // Set thumbnail
-    elements.videoThumbnail.src = info.thumbnail || '/static/img/placeholder.png';
+    elements.videoThumbnail.src = info.thumbnail_url || info.thumbnail || '/static/img/placeholder.png';
     elements.videoThumbnail.onerror = () => {
         elements.videoThumbnail.src = 'data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 400 225"><rect fill="%23334155" width="400" height="225"/><text x="50%" y="50%" fill="%2394a3b8" font-family="sans-serif" font-size="16" text-anchor="middle" dy=".3em">No Thumbnail</text></svg>';
     };
@@ -290,7 +300,7 @@ function displayVideoInfo(info) {
     
     // Handle playlist info
     state.isPlaylist = info.is_playlist || false;
-    state.playlistVideos = info.playlist_videos || [];
+    state.playlistVideos = info.playlist_videos || info.entries || [];
     state.selectedPlaylistIndices = state.playlistVideos.map((_, i) => i); // Select all by default
     
     if (state.isPlaylist && state.playlistVideos.length > 0) {
@@ -376,6 +386,9 @@ async function startDownload() {
                     audio_only: state.selectedFormat === 'audio',
                     audio_format: state.selectedAudioFormat,
                     selected_indices: state.selectedPlaylistIndices,
+                    // Send the entries we already have so the server doesn't re-extract the playlist
+                    entries: state.playlistVideos,
+                    playlist_title: state.videoInfo?.playlist_title,
                     download_subs: state.downloadSubs,
                     sub_lang: state.subtitleLang,
                     embed_subs: state.embedSubs
@@ -444,74 +457,179 @@ function addActiveDownload(id, title) {
         progress: 0
     });
     
-    renderActiveDownloads();
+    renderActiveDownloads(id);
 }
 
-function renderActiveDownloads() {
-    if (state.activeDownloads.size === 0) {
-        elements.activeDownloads.classList.add('hidden');
-        return;
+// Rows of the active downloads list, keyed by download id. Each row is built
+// once; a progress tick only touches the parts of its row that changed, and
+// ticks arriving within one frame are drawn together.
+const downloadRows = new Map();
+const dirtyDownloads = new Set();
+let downloadsFrame = 0;
+
+function renderActiveDownloads(id) {
+    if (id === undefined) {
+        state.activeDownloads.forEach((_, key) => dirtyDownloads.add(key));
+    } else {
+        dirtyDownloads.add(id);
+    }
+    if (!downloadsFrame) {
+        downloadsFrame = requestAnimationFrame(flushActiveDownloads);
+    }
+}
+
+function flushActiveDownloads() {
+    downloadsFrame = 0;
+    elements.activeDownloads.classList.toggle('hidden', state.activeDownloads.size === 0);
+    
+    dirtyDownloads.forEach(id => {
+        const download = state.activeDownloads.get(id);
+        if (download) {
+            patchDownloadRow(download);
+        } else if (downloadRows.has(id)) {
+            downloadRows.get(id).element.remove();
+            downloadRows.delete(id);
+        }
+    });
+    dirtyDownloads.clear();
+}
+
+function createDownloadRow(id) {
+    const element = document.createElement('div');
+    element.dataset.id = id;
+    element.innerHTML = `
+        <div class="download-header">
+            <div class="download-title">
+                <i></i>
+                <span></span>
+            </div>
+            <div class="download-actions">
+                <button class="btn btn-retry hidden" data-id="${escapeHtml(id)}"><i class="fas fa-redo"></i> </button>
+                <span></span>
+            </div>
+        </div>
+        <div class="download-progress">
+            <div></div>
+        </div>
+        <div class="download-info">
+            <span><i class="fas fa-percentage"></i> </span>
+            <span><i class="fas fa-tachometer-alt"></i> </span>
+            <span><i class="fas fa-clock"></i> </span>
+            <span><i class="fas fa-file"></i> </span>
+        </div>
+        <div class="download-warning hidden"><i class="fas fa-exclamation-circle"></i> </div>
+        <div class="download-error hidden"><i class="fas fa-exclamation-triangle"></i> </div>
+    `;
+    
+    const title = element.querySelector('.download-title');
+    const actions = element.querySelector('.download-actions');
+    const info = element.querySelectorAll('.download-info span');
+    const text = node => node.lastChild;  // The text after the icon
+    return {
+        element,
+        rendered: {},
+        parts: {
+            itemClass: element,
+            icon: title.querySelector('i'),
+            title: title.querySelector('span'),
+            retry: actions.querySelector('.btn-retry'),
+            retryText: text(actions.querySelector('.btn-retry')),
+            status: actions.querySelector('span'),
+            bar: element.querySelector('.download-progress div'),
+            percent: text(info[0]),
+            speed: text(info[1]),
+            eta: text(info[2]),
+            filesize: text(info[3]),
+            warning: element.querySelector('.download-warning'),
+            warningText: text(element.querySelector('.download-warning')),
+            error: element.querySelector('.download-error'),
+            errorText: text(element.querySelector('.download-error'))
+        }
+    };
+}
+
+function patchDownloadRow(download) {
+    let row = downloadRows.get(download.id);
+    if (!row) {
+        row = createDownloadRow(download.id);
+        downloadRows.set(download.id, row);
+        elements.downloadsList.appendChild(row.element);
     }
     
-    elements.activeDownloads.classList.remove('hidden');
+    const isMerging = download.is_merging || download.status === 'processing';
+    const statusIcon = download.status === 'completed' ? 'fa-check-circle' : 
+                      download.status === 'error' ? 'fa-exclamation-circle' : 
+                      isMerging ? 'fa-cog fa-spin' : 'fa-download';
+    // Retry button for failed downloads, error and warning (e.g. subtitles failed) messages
+    const retry = download.status === 'error' && download.can_retry ?
+        `Retry${download.retry_count > 0 ? ` (${download.retry_count}/3)` : ''}` : '';
+    const error = download.status === 'error' && download.error ? download.error : '';
+    const warning = download.warning || '';
+    
+    const view = {
+        itemClass: `download-item ${download.status === 'error' ? 'has-error' : ''}`,
+        icon: `fas ${statusIcon}`,
+        title: download.title,
+        status: formatStatus(download.status, download.is_merging),
+        statusClass: `download-status ${download.status}`,
+        barClass: `download-progress-bar ${isMerging ? 'merging' : ''}`,
+        barWidth: `${download.progress}%`,
+        percent: isMerging ? 'Merging video & audio...' : `${download.progress.toFixed(1)}%`,
+        speed: download.speed || '--',
+        eta: download.eta || '--',
+        filesize: download.filesize || '--',
+        retry,
+        warning,
+        error
+    };
     
-    elements.downloadsList.innerHTML = Array.from(state.activeDownloads.values())
-        .map(download => {
-            const isMerging = download.is_merging || download.status === 'processing';
-            const statusIcon = download.status === 'completed' ? 'fa-check-circle' : 
-                              download.status === 'error' ? 'fa-exclamation-circle' : 
-                              isMerging ? 'fa-cog fa-spin' : 'fa-download';
-            const progressText = isMerging ? 'Merging video & audio...' : `${download.progress.toFixed(1)}%`;
-            
-            // Show retry button for failed downloads
-            const retryButton = download.status === 'error' && download.can_retry ? 
-                `<button class="btn btn-retry" data-id="${download.id}" onclick="retryDownload('${download.id}')">
-                    <i class="fas fa-redo"></i> Retry${download.retry_count > 0 ? ` (${download.retry_count}/3)` : ''}
-                </button>` : '';
-            
-            // Show error message if failed
-            const errorMessage = download.status === 'error' && download.error ? 
-                `<div class="download-error"><i class="fas fa-exclamation-triangle"></i> ${download.error}</div>` : '';
-            
-            // Show warning message (e.g., subtitle download failed)
-            const warningMessage = download.warning ? 
-                `<div class="download-warning"><i class="fas fa-exclamation-circle"></i> ${download.warning}</div>` : '';
-            
-            return `
-                <div class="download-item ${download.status === 'error' ? 'has-error' : ''}" data-id="${download.id}">
-                    <div class="download-header">
-                        <div class="download-title">
-                            <i class="fas ${statusIcon}"></i>
-                            <span>${download.title}</span>
-                        </div>
-                        <div class="download-actions">
-                            ${retryButton}
-                            <span class="download-status ${download.status}">${formatStatus(download.status, download.is_merging)}</span>
-                        </div>
-                    </div>
-                    <div class="download-progress">
-                        <div class="download-progress-bar ${isMerging ? 'merging' : ''}" style="width: ${download.progress}%"></div>
-                    </div>
-                    <div class="download-info">
-                        <span><i class="fas fa-percentage"></i> ${progressText}</span>
-                        <span><i class="fas fa-tachometer-alt"></i> ${download.speed || '--'}</span>
-                        <span><i class="fas fa-clock"></i> ${download.eta || '--'}</span>
-                        <span><i class="fas fa-file"></i> ${download.filesize || '--'}</span>
-                    </div>
-                    ${warningMessage}
-                    ${errorMessage}
-                </div>
-            `;
-        }).join('');
+    const { parts, rendered } = row;
+    for (const [key, value] of Object.entries(view)) {
+        if (rendered[key] === value) {
+            continue;
+        }
+        rendered[key] = value;
+        switch (key) {
+            case 'itemClass':
+            case 'icon':
+                parts[key].className = value;
+                break;
+            case 'title':
+            case 'status':
+                parts[key].textContent = value;
+                break;
+            case 'statusClass':
+                parts.status.className = value;
+                break;
+            case 'barClass':
+                parts.bar.className = value;
+                break;
+            case 'barWidth':
+                parts.bar.style.width = value;
+                break;
+            case 'retry':
+            case 'warning':
+            case 'error':
+                parts[key].classList.toggle('hidden', !value);
+                parts[`${key}Text`].nodeValue = ` ${value}`;
+                break;
+            default:
+                parts[key].nodeValue = ` ${value}`;
+        }
+    }
 }
 
 function formatStatus(status, isMerging = false) {
     if (isMerging) return 'Merging';
     const statusMap = {
         pending: 'Pending',
+        queued: 'Queued',
+        scheduled: 'Scheduled',
         starting: 'Starting',
         downloading: 'Downloading',
         processing: 'Processing',
+        retrying: 'Retrying',
+        waiting: 'Waiting for host',
         completed: 'Completed',
         error: 'Error'
     };
@@ -543,7 +661,7 @@ function trackDownloadProgress(downloadId) {
                     if (download) {
                         download.status = 'error';
                         download.error = 'Download tracking lost. Check library for completed files.';
-                        renderActiveDownloads();
+                        renderActiveDownloads(downloadId);
                     }
                     return;
                 }
@@ -559,7 +677,9 @@ function trackDownloadProgress(downloadId) {
                     status: data.status,
                     progress: data.progress || 0,
                     speed: data.speed || '',
-                    eta: data.eta || '',
+                    // While backing off or scheduled, show when the next attempt happens instead of an ETA
+                    eta: data.scheduled_for ? `starts ${new Date(data.scheduled_for).toLocaleString()}` :
+                        data.next_retry_in ? `retry in ${Math.ceil(data.next_retry_in)}s` : (data.eta || ''),
                     filesize: data.filesize || '',
                     title: data.title || download.title,
                     is_merging: data.is_merging || false,
@@ -570,18 +690,18 @@ function trackDownloadProgress(downloadId) {
                     url: data.url || download.url
                 });
                 
-                renderActiveDownloads();
+                renderActiveDownloads(downloadId);
                 
                 // Continue polling if not finished
                 if (data.status !== 'completed' && data.status !== 'error') {
                     // Use shorter interval during active download, longer during processing
-                    const interval = data.status === 'processing' ? 1000 : 500;
+                    const interval = data.status === 'scheduled' ? 30000 : data.status === 'processing' ? 1000 : 500;
                     setTimeout(checkProgress, interval);
                 } else if (data.status === 'completed') {
                     showToast(`Download completed: ${data.title || 'Video'}`, 'success');
                     // Refresh library if on library tab
                     if (state.currentTab === 'library') {
-                        loadLibrary();
+                        loadLibrary(true);
                     }
                 } else if (data.status === 'error') {
                     showToast(`Download failed: ${data.error || 'Unknown error'}. ${data.can_retry ? 'Click Retry to try again.' : ''}`, 'error');
@@ -631,7 +751,7 @@ async function retryDownload(downloadId) {
         download.progress = 0;
         download.error = '';
         download.retry_count = data.retry_count;
-        renderActiveDownloads();
+        renderActiveDownloads(downloadId);
         
         // Resume progress tracking
         trackDownloadProgress(downloadId);
@@ -641,60 +761,198 @@ async function retryDownload(downloadId) {
     }
 }
 
-// Make retryDownload available globally for onclick handler
-window.retryDownload = retryDownload;
-
-// Library Functions
-async function loadLibrary() {
-    try {
-        const response = await fetch('/api/downloads');
-        const files = await response.json();
+// Virtual Lists
+// The library and history can hold thousands of rows. Only the rows in view
+// (plus some overscan) exist in the DOM; pages are fetched from the server as
+// they scroll into view and kept until the list is reloaded.
+class VirtualList {
+    constructor(container, { fetchPage, renderRow, pageSize = 50, overscan = 6 }) {
+        this.container = container;
+        this.fetchPage = fetchPage;  // (offset, limit) => Promise<{ items, total }>
+        this.renderRow = renderRow;  // item => HTML of one row
+        this.pageSize = pageSize;
+        this.overscan = overscan;
         
-        if (files.error) {
-            throw new Error(files.error);
-        }
+        this.pages = new Map();  // page number -> items, or the pending request
+        this.rows = new Map();  // index -> element
+        this.total = 0;
+        this.rowHeight = 0;  // Measured from a loaded row, rows all share a layout
+        this.remeasure = false;  // Set on resize, the old height stays in use until then
+        this.generation = 0;  // Bumped on reload so stale responses are dropped
+        this.frame = 0;
         
-        if (files.length === 0) {
-            elements.libraryEmpty.classList.remove('hidden');
-            elements.libraryFiles.classList.add('hidden');
-            return;
+        this.spacer = document.createElement('div');
+        this.spacer.className = 'virtual-list-spacer';
+        container.classList.add('virtual-list');
+        container.appendChild(this.spacer);
+        
+        container.addEventListener('scroll', () => this.scheduleUpdate(), { passive: true });
+        window.addEventListener('resize', () => {
+            this.remeasure = true;
+            this.scheduleUpdate();
+        });
+    }
+    
+    async reload(keepScroll = false) {
+        this.generation++;
+        this.pages.clear();
+        this.rows.forEach(row => row.remove());
+        this.rows.clear();
+        if (!keepScroll) {
+            this.container.scrollTop = 0;
+        }
+        const first = this.rowHeight ? Math.floor(this.container.scrollTop / this.rowHeight) : 0;
+        await this.loadPage(Math.floor(first / this.pageSize));
+        return this.total;
+    }
+    
+    loadPage(page) {
+        if (!this.pages.has(page)) {
+            const generation = this.generation;
+            const request = this.fetchPage(page * this.pageSize, this.pageSize).then(({ items, total }) => {
+                if (generation === this.generation) {
+                    this.pages.set(page, items);
+                    this.total = total;
+                    this.scheduleUpdate();
+                }
+            }).catch(error => {
+                if (generation === this.generation) {
+                    this.pages.delete(page);  // Retried when it scrolls into view again
+                }
+                throw error;
+            });
+            this.pages.set(page, request);
+        }
+        const pending = this.pages.get(page);
+        return Array.isArray(pending) ? Promise.resolve() : pending;
+    }
+    
+    item(index) {
+        const page = this.pages.get(Math.floor(index / this.pageSize));
+        return Array.isArray(page) ? page[index % this.pageSize] : undefined;
+    }
+    
+    scheduleUpdate() {
+        if (!this.frame) {
+            this.frame = requestAnimationFrame(() => {
+                this.frame = 0;
+                this.update();
+            });
+        }
+    }
+    
+    update() {
+        if (!this.rowHeight || this.remeasure) {
+            const anchor = this.rowHeight ? this.container.scrollTop / this.rowHeight : 0;
+            if (this.measure()) {
+                // Keep the same row at the top after a resize changed the height
+                this.spacer.style.height = `${this.total * this.rowHeight}px`;
+                this.container.scrollTop = anchor * this.rowHeight;
+            } else if (!this.rowHeight) {
+                return;
+            }
         }
+        this.spacer.style.height = `${this.total * this.rowHeight}px`;
         
-        elements.libraryEmpty.classList.add('hidden');
-        elements.libraryFiles.classList.remove('hidden');
+        const top = this.container.scrollTop;
+        const first = Math.max(0, Math.floor(top / this.rowHeight) - this.overscan);
+        const last = Math.min(this.total, Math.ceil((top + this.container.clientHeight) / this.rowHeight) + this.overscan);
         
-        elements.libraryFiles.innerHTML = files.map(file => `
-            <div class="file-item" data-filename="${file.filename}">
-                <div class="file-icon ${isAudioFile(file.filename) ? 'audio' : ''}">
-                    <i class="fas ${isAudioFile(file.filename) ? 'fa-music' : 'fa-video'}"></i>
-                </div>
-                <div class="file-info">
-                    <div class="file-name" title="${file.filename}">${file.filename}</div>
-                    <div class="file-meta">
-                        <span><i class="fas fa-file"></i> ${formatFileSize(file.size)}</span>
-                        <span><i class="fas fa-calendar"></i> ${formatDate(file.modified)}</span>
-                    </div>
-                </div>
-                <div class="file-actions">
-                    <button class="btn btn-primary btn-download-file" data-filename="${file.filename}">
-                        <i class="fas fa-download"></i>
-                    </button>
-                    <button class="btn btn-danger btn-delete-file" data-filename="${file.filename}">
-                        <i class="fas fa-trash"></i>
-                    </button>
+        this.rows.forEach((row, index) => {
+            if (index < first || index >= last) {
+                row.remove();
+                this.rows.delete(index);
+            }
+        });
+        for (let index = first; index < last; index++) {
+            if (this.rows.has(index)) {
+                continue;
+            }
+            const item = this.item(index);
+            if (item === undefined) {
+                this.loadPage(Math.floor(index / this.pageSize)).catch(error => console.error(error));
+                continue;
+            }
+            this.addRow(index, item);
+        }
+    }
+    
+    addRow(index, item) {
+        const template = document.createElement('template');
+        template.innerHTML = this.renderRow(item).trim();
+        const row = template.content.firstElementChild;
+        row.classList.add('virtual-row');
+        row.style.top = `${index * this.rowHeight}px`;
+        this.rows.set(index, row);
+        this.spacer.appendChild(row);
+        return row;
+    }
+    
+    measure() {
+        // Any loaded row will do: after a reload deep in the list page 0 isn't loaded
+        const page = [...this.pages.keys()].find(page => Array.isArray(this.pages.get(page)) && this.pages.get(page).length);
+        if (page === undefined) {
+            return false;
+        }
+        // Rows are absolutely positioned, so the list's gap is added by hand
+        const index = page * this.pageSize;
+        const row = this.rows.get(index) || this.addRow(index, this.item(index));
+        const gap = parseFloat(getComputedStyle(this.container).rowGap) || 0;
+        const height = row.offsetHeight;
+        // Rows placed with the old (or no) height are redrawn
+        this.rows.forEach(row => row.remove());
+        this.rows.clear();
+        if (!height) {
+            return false;
+        }
+        this.rowHeight = height + gap;
+        this.remeasure = false;
+        return true;
+    }
+}
+
+async function fetchListPage(url, params) {
+    const response = await fetch(`${url}?${new URLSearchParams(params)}`);
+    const items = await response.json();
+    
+    if (items.error) {
+        throw new Error(items.error);
+    }
+    return { items, total: parseInt(response.headers.get('X-Total-Count'), 10) || items.length };
+}
+
+// Library Functions
+const libraryList = new VirtualList(elements.libraryFiles, {
+    fetchPage: (offset, limit) => fetchListPage('/api/downloads', { offset, limit }),
+    renderRow: file => `
+        <div class="file-item" data-filename="${escapeHtml(file.filename)}">
+            <div class="file-icon ${isAudioFile(file.filename) ? 'audio' : ''}">
+                <i class="fas ${isAudioFile(file.filename) ? 'fa-music' : 'fa-video'}"></i>
+            </div>
+            <div class="file-info">
+                <div class="file-name" title="${escapeHtml(file.path || file.filename)}">${escapeHtml(file.title || file.filename)}</div>
+                <div class="file-meta">
+                    <span><i class="fas fa-file"></i> ${formatFileSize(file.size)}</span>
+                    <span><i class="fas fa-calendar"></i> ${formatDate(file.modified)}</span>
                 </div>
             </div>
-        `).join('');
-        
-        // Add event listeners
-        elements.libraryFiles.querySelectorAll('.btn-download-file').forEach(btn => {
-            btn.addEventListener('click', () => downloadFile(btn.dataset.filename));
-        });
-        
-        elements.libraryFiles.querySelectorAll('.btn-delete-file').forEach(btn => {
-            btn.addEventListener('click', () => deleteFile(btn.dataset.filename));
-        });
-        
+            <div class="file-actions">
+                <button class="btn btn-primary btn-download-file" data-filename="${escapeHtml(file.filename)}">
+                    <i class="fas fa-download"></i>
+                </button>
+                <button class="btn btn-danger btn-delete-file" data-filename="${escapeHtml(file.filename)}">
+                    <i class="fas fa-trash"></i>
+                </button>
+            </div>
+        </div>
+    `
+});
+
+async function loadLibrary(keepScroll = false) {
+    try {
+        const total = await libraryList.reload(keepScroll);
+        elements.libraryEmpty.classList.toggle('hidden', total > 0);
+        elements.libraryFiles.classList.toggle('hidden', total === 0);
     } catch (error) {
         showToast('Failed to load library: ' + error.message, 'error');
     }
@@ -708,6 +966,38 @@ function downloadFile(filename) {
     showToast('Download started', 'success');
 }
 
+async function exportLibrary() {
+    // Only part of the library is loaded, so the server picks the files
+    if (libraryList.total === 0) {
+        showToast('No files to export', 'error');
+        return;
+    }
+    
+    try {
+        const response = await fetch('/api/export', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ all: true })
+        });
+        
+        const data = await response.json();
+        
+        if (!response.ok) {
+            throw new Error(data.error || 'Failed to export files');
+        }
+        
+        // The archive is streamed by the browser's own downloader, which can resume it
+        const link = document.createElement('a');
+        link.href = data.url;
+        link.download = data.filename;
+        link.click();
+        showToast(`Exporting ${data.files} files (${formatFileSize(data.size)})`, 'success');
+        
+    } catch (error) {
+        showToast('Failed to export: ' + error.message, 'error');
+    }
+}
+
 async function deleteFile(filename) {
     if (!confirm(`Delete "${filename}"?`)) {
         return;
@@ -725,7 +1015,7 @@ async function deleteFile(filename) {
         }
         
         showToast('File deleted successfully', 'success');
-        loadLibrary();
+        loadLibrary(true);
         
     } catch (error) {
         showToast('Failed to delete: ' + error.message, 'error');
@@ -791,7 +1081,8 @@ function initializeEventListeners() {
     elements.downloadBtn.addEventListener('click', startDownload);
     
     // Refresh library
-    elements.refreshLibraryBtn.addEventListener('click', loadLibrary);
+    elements.refreshLibraryBtn.addEventListener('click', () => loadLibrary());
+    elements.exportLibraryBtn.addEventListener('click', exportLibrary);
     
     // Handle paste
     elements.urlInput.addEventListener('paste', (e) => {
@@ -892,7 +1183,6 @@ function initializeEventListeners() {
             clearTimeout(searchTimeout);
             searchTimeout = setTimeout(() => {
                 state.historySearch = e.target.value.trim();
-                state.historyPage = 0;
                 loadHistory();
             }, 300);
         });
@@ -902,21 +1192,36 @@ function initializeEventListeners() {
         elements.clearHistoryBtn.addEventListener('click', clearAllHistory);
     }
     
-    if (elements.historyPrev) {
-        elements.historyPrev.addEventListener('click', () => {
-            if (state.historyPage > 0) {
-                state.historyPage--;
-                loadHistory();
-            }
-        });
-    }
+    // Rows come and go as lists update and scroll, so their buttons are handled here
+    elements.historyList.addEventListener('click', (e) => {
+        const button = e.target.closest('button');
+        if (!button) return;
+        if (button.classList.contains('btn-redownload')) {
+            redownloadFromHistory(button.dataset.id);
+        } else if (button.classList.contains('btn-copy-url')) {
+            navigator.clipboard.writeText(button.dataset.url);
+            showToast('URL copied to clipboard', 'success');
+        } else if (button.classList.contains('btn-delete-history')) {
+            deleteHistoryItem(button.dataset.id);
+        }
+    });
     
-    if (elements.historyNext) {
-        elements.historyNext.addEventListener('click', () => {
-            state.historyPage++;
-            loadHistory();
-        });
-    }
+    elements.libraryFiles.addEventListener('click', (e) => {
+        const button = e.target.closest('button');
+        if (!button) return;
+        if (button.classList.contains('btn-download-file')) {
+            downloadFile(button.dataset.filename);
+        } else if (button.classList.contains('btn-delete-file')) {
+            deleteFile(button.dataset.filename);
+        }
+    });
+    
+    elements.downloadsList.addEventListener('click', (e) => {
+        const button = e.target.closest('.btn-retry');
+        if (button) {
+            retryDownload(button.dataset.id);
+        }
+    });
 }
 
 // Initialize
@@ -1053,94 +1358,55 @@ async function startBatchDownload() {
 
 // ==================== HISTORY FUNCTIONS ====================
 
-async function loadHistory() {
-    try {
-        const params = new URLSearchParams({
-            limit: state.historyLimit,
-            offset: state.historyPage * state.historyLimit
-        });
-        
+const historyList = new VirtualList(elements.historyList, {
+    fetchPage: (offset, limit) => {
+        const params = { offset, limit };
         if (state.historySearch) {
-            params.append('search', state.historySearch);
+            params.search = state.historySearch;
         }
-        
-        const response = await fetch(`/api/history?${params}`);
-        const data = await response.json();
-        
-        if (data.error) {
-            throw new Error(data.error);
-        }
-        
-        const history = data.history || [];
-        const total = data.total || 0;
-        
-        if (history.length === 0) {
-            elements.historyEmpty.classList.remove('hidden');
-            elements.historyList.classList.add('hidden');
-            elements.historyPagination.classList.add('hidden');
-            return;
-        }
-        
-        elements.historyEmpty.classList.add('hidden');
-        elements.historyList.classList.remove('hidden');
-        
-        elements.historyList.innerHTML = history.map(item => `
-            <div class="history-item" data-id="${item.id}">
-                <div class="history-thumbnail">
-                    ${item.thumbnail ? 
-                        `<img src="${item.thumbnail}" alt="Thumbnail" onerror="this.src='data:image/svg+xml,<svg xmlns=%22http://www.w3.org/2000/svg%22 viewBox=%220 0 120 68%22><rect fill=%22%23334155%22 width=%22120%22 height=%2268%22/><text x=%2250%%22 y=%2250%%22 fill=%22%2394a3b8%22 font-size=%2210%22 text-anchor=%22middle%22>No Thumb</text></svg>'">` : 
-                        `<div class="no-thumbnail"><i class="fas fa-video"></i></div>`
-                    }
-                </div>
-                <div class="history-info">
-                    <div class="history-title" title="${item.title}">${item.title}</div>
-                    <div class="history-meta">
-                        <span><i class="fas fa-globe"></i> ${item.site || 'Unknown'}</span>
-                        <span><i class="fas fa-${item.format_type === 'audio' ? 'music' : 'video'}"></i> ${item.format_type || 'video'}</span>
-                        <span><i class="fas fa-calendar"></i> ${formatDate(item.downloaded_at)}</span>
-                    </div>
-                </div>
-                <div class="history-actions">
-                    <button class="btn btn-primary btn-small btn-redownload" data-id="${item.id}" title="Download again">
-                        <i class="fas fa-redo"></i>
-                    </button>
-                    <button class="btn btn-secondary btn-small btn-copy-url" data-url="${item.url}" title="Copy URL">
-                        <i class="fas fa-copy"></i>
-                    </button>
-                    <button class="btn btn-danger btn-small btn-delete-history" data-id="${item.id}" title="Delete">
-                        <i class="fas fa-trash"></i>
-                    </button>
+        return fetchListPage('/api/history', params);
+    },
+    renderRow: item => `
+        <div class="history-item" data-id="${escapeHtml(item.id)}">
+            <div class="history-thumbnail">
+                ${item.thumbnail ? 
+                    `<img src="${escapeHtml(item.thumbnail_url || item.thumbnail)}" alt="Thumbnail" loading="lazy" onerror="this.src='data:image/svg+xml,<svg xmlns=%22http://www.w3.org/2000/svg%22 viewBox=%220 0 120 68%22><rect fill=%22%23334155%22 width=%22120%22 height=%2268%22/><text x=%2250%%22 y=%2250%%22 fill=%22%2394a3b8%22 font-size=%2210%22 text-anchor=%22middle%22>No Thumb</text></svg>'">` : 
+                    `<div class="no-thumbnail"><i class="fas fa-video"></i></div>`
+                }
+            </div>
+            <div class="history-info">
+                <div class="history-title" title="${escapeHtml(item.title)}">${escapeHtml(item.title)}</div>
+                <div class="history-meta">
+                    <span><i class="fas fa-globe"></i> ${escapeHtml(getHost(item.url) || 'Unknown')}</span>
+                    <span><i class="fas fa-${item.format_type === 'audio' ? 'music' : 'video'}"></i> ${escapeHtml(item.format_type || 'video')}</span>
+                    <span><i class="fas fa-calendar"></i> ${formatDate(item.completed_at || historyCreatedAt(item))}</span>
                 </div>
             </div>
-        `).join('');
-        
-        // Add event listeners
-        elements.historyList.querySelectorAll('.btn-redownload').forEach(btn => {
-            btn.addEventListener('click', () => redownloadFromHistory(btn.dataset.id));
-        });
-        
-        elements.historyList.querySelectorAll('.btn-copy-url').forEach(btn => {
-            btn.addEventListener('click', () => {
-                navigator.clipboard.writeText(btn.dataset.url);
-                showToast('URL copied to clipboard', 'success');
-            });
-        });
-        
-        elements.historyList.querySelectorAll('.btn-delete-history').forEach(btn => {
-            btn.addEventListener('click', () => deleteHistoryItem(btn.dataset.id));
-        });
-        
-        // Update pagination
-        const totalPages = Math.ceil(total / state.historyLimit);
-        if (totalPages > 1) {
-            elements.historyPagination.classList.remove('hidden');
-            elements.historyPageInfo.textContent = `Page ${state.historyPage + 1} of ${totalPages}`;
-            elements.historyPrev.disabled = state.historyPage === 0;
-            elements.historyNext.disabled = state.historyPage >= totalPages - 1;
-        } else {
-            elements.historyPagination.classList.add('hidden');
-        }
-        
+            <div class="history-actions">
+                <button class="btn btn-primary btn-small btn-redownload" data-id="${escapeHtml(item.id)}" title="Download again">
+                    <i class="fas fa-redo"></i>
+                </button>
+                <button class="btn btn-secondary btn-small btn-copy-url" data-url="${escapeHtml(item.url)}" title="Copy URL">
+                    <i class="fas fa-copy"></i>
+                </button>
+                <button class="btn btn-danger btn-small btn-delete-history" data-id="${escapeHtml(item.id)}" title="Delete">
+                    <i class="fas fa-trash"></i>
+                </button>
+            </div>
+        </div>
+    `
+});
+
+// SQLite's CURRENT_TIMESTAMP is UTC without a zone marker
+function historyCreatedAt(item) {
+    return item.created_at ? `${item.created_at.replace(' ', 'T')}Z` : '';
+}
+
+async function loadHistory(keepScroll = false) {
+    try {
+        const total = await historyList.reload(keepScroll);
+        elements.historyEmpty.classList.toggle('hidden', total > 0);
+        elements.historyList.classList.toggle('hidden', total === 0);
     } catch (error) {
         showToast('Failed to load history: ' + error.message, 'error');
     }
@@ -1191,7 +1457,7 @@ async function deleteHistoryItem(historyId) {
         }
         
         showToast('Deleted from history', 'success');
-        loadHistory();
+        loadHistory(true);
         
     } catch (error) {
         showToast(error.message, 'error');